@@ -71,6 +71,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'manga_translator.wsgi.application'
 
+ASGI_APPLICATION = 'manga_translator.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -123,3 +125,150 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Cola de trabajos de traducción
+# Los workers se lanzan con: python manage.py run_translation_worker --workers N
+
+TRANSLATION_WORKER_PROCESSES = int(os.environ.get('TRANSLATION_WORKER_PROCESSES', 2))
+
+TRANSLATION_WORKER_POLL_INTERVAL = float(os.environ.get('TRANSLATION_WORKER_POLL_INTERVAL', 2))
+
+# Debe ser mayor que el tiempo máximo de procesamiento de una página
+TRANSLATION_JOB_LEASE_SECONDS = int(os.environ.get('TRANSLATION_JOB_LEASE_SECONDS', 900))
+
+TRANSLATION_JOB_MAX_ATTEMPTS = int(os.environ.get('TRANSLATION_JOB_MAX_ATTEMPTS', 2))
+
+
+# OCR
+# Idiomas cuyo lector EasyOCR se precarga al arrancar los workers
+
+OCR_WARMUP_LANGUAGES = [
+    lang.strip() for lang in os.environ.get('OCR_WARMUP_LANGUAGES', 'auto').split(',') if lang.strip()
+]
+
+# Precargar también en los procesos web (gunicorn, uvicorn...); el OCR corre en run_translation_worker
+OCR_WARMUP_IN_WEB = os.environ.get('OCR_WARMUP_IN_WEB', 'false').lower() in ('1', 'true', 'yes')
+
+
+# Memoria de traducción (caché persistente de traducciones del LLM)
+
+TRANSLATION_MEMORY_ENABLED = os.environ.get('TRANSLATION_MEMORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+TRANSLATION_MEMORY_TTL_DAYS = int(os.environ.get('TRANSLATION_MEMORY_TTL_DAYS', 90))
+
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.environ.get('TRANSLATION_MEMORY_MAX_ENTRIES', 50000))
+
+# Cada cuántas entradas nuevas se ejecuta la expulsión por TTL/LRU
+TRANSLATION_MEMORY_EVICT_EVERY = int(os.environ.get('TRANSLATION_MEMORY_EVICT_EVERY', 500))
+
+
+# Deduplicación de páginas subidas
+# Con el hash perceptual también se reutilizan copias re-codificadas de la misma página
+
+PAGE_DEDUP_ENABLED = os.environ.get('PAGE_DEDUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+PAGE_DEDUP_PERCEPTUAL = os.environ.get('PAGE_DEDUP_PERCEPTUAL', 'false').lower() in ('1', 'true', 'yes')
+
+# Los candidatos por hash perceptual solo se reutilizan si tienen las mismas dimensiones y
+# como mucho esta fracción de píxeles difiere más de PAGE_DEDUP_PIXEL_THRESHOLD (0-255)
+PAGE_DEDUP_MAX_DIFF_RATIO = float(os.environ.get('PAGE_DEDUP_MAX_DIFF_RATIO', 0.0005))
+
+PAGE_DEDUP_PIXEL_THRESHOLD = int(os.environ.get('PAGE_DEDUP_PIXEL_THRESHOLD', 48))
+
+
+# Guarda la imagen sin texto (results/debug_no_text.jpg) en cada renderizado
+
+SAVE_DEBUG_IMAGES = os.environ.get('SAVE_DEBUG_IMAGES', 'false').lower() in ('1', 'true', 'yes')
+
+
+# Algoritmo para borrar el texto original: 'telea', 'ns' o 'flat' (relleno liso)
+
+INPAINT_METHOD = os.environ.get('INPAINT_METHOD', 'telea')
+
+# Las regiones dentro de globos blancos se borran con relleno liso en lugar de inpainting
+BUBBLE_FLAT_FILL = os.environ.get('BUBBLE_FLAT_FILL', 'true').lower() in ('1', 'true', 'yes')
+
+
+# Capítulos: pipeline por etapas (OCR → traducción → renderizado) con workers por etapa
+
+CHAPTER_MAX_PAGES = int(os.environ.get('CHAPTER_MAX_PAGES', 300))
+
+# Tamaño máximo descomprimido de un capítulo subido como ZIP (bytes)
+CHAPTER_ARCHIVE_MAX_BYTES = int(os.environ.get('CHAPTER_ARCHIVE_MAX_BYTES', 200 * 1024 * 1024))
+
+CHAPTER_PIPELINE_OCR_WORKERS = int(os.environ.get('CHAPTER_PIPELINE_OCR_WORKERS', 1))
+
+CHAPTER_PIPELINE_TRANSLATE_WORKERS = int(os.environ.get('CHAPTER_PIPELINE_TRANSLATE_WORKERS', 2))
+
+CHAPTER_PIPELINE_RENDER_WORKERS = int(os.environ.get('CHAPTER_PIPELINE_RENDER_WORKERS', 1))
+
+# Páginas en espera entre etapas (acota la memoria de imágenes decodificadas)
+CHAPTER_PIPELINE_QUEUE_SIZE = int(os.environ.get('CHAPTER_PIPELINE_QUEUE_SIZE', 2))
+
+# Contexto de traducción por capítulo (resumen acumulado + últimas líneas), enviado una vez por petición
+CHAPTER_CONTEXT_ENABLED = os.environ.get('CHAPTER_CONTEXT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+CHAPTER_CONTEXT_RECENT_LINES = int(os.environ.get('CHAPTER_CONTEXT_RECENT_LINES', 6))
+
+CHAPTER_CONTEXT_SUMMARY_MAX_CHARS = int(os.environ.get('CHAPTER_CONTEXT_SUMMARY_MAX_CHARS', 600))
+
+# Páginas consecutivas que se traducen juntas en las mismas peticiones
+CHAPTER_CONTEXT_BATCH_PAGES = int(os.environ.get('CHAPTER_CONTEXT_BATCH_PAGES', 3))
+
+# Eventos de progreso por página servidos por SSE (api/translations/<id>/events/)
+PROGRESS_EVENTS_ENABLED = os.environ.get('PROGRESS_EVENTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+PROGRESS_EVENT_RETENTION_HOURS = int(os.environ.get('PROGRESS_EVENT_RETENTION_HOURS', 24))
+
+# Segundos entre consultas de eventos nuevos dentro de cada conexión SSE
+PROGRESS_STREAM_POLL_INTERVAL = float(os.environ.get('PROGRESS_STREAM_POLL_INTERVAL', 0.5))
+
+PROGRESS_STREAM_HEARTBEAT = float(os.environ.get('PROGRESS_STREAM_HEARTBEAT', 15))
+
+# Duración máxima de una conexión; el navegador se reconecta con Last-Event-ID
+PROGRESS_STREAM_TIMEOUT = float(os.environ.get('PROGRESS_STREAM_TIMEOUT', 300))
+
+# OCR por franjas para tiras verticales muy altas (webtoons); se activa si la altura supera 1.5 franjas
+OCR_TILING_ENABLED = os.environ.get('OCR_TILING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+OCR_TILE_HEIGHT = int(os.environ.get('OCR_TILE_HEIGHT', 1600))
+
+# Debe superar la altura de una línea de texto
+OCR_TILE_OVERLAP = int(os.environ.get('OCR_TILE_OVERLAP', 200))
+
+OCR_TILE_IOU_THRESHOLD = float(os.environ.get('OCR_TILE_IOU_THRESHOLD', 0.5))
+
+# Pool de procesos de OCR (0 = desactivado): páginas de un capítulo y franjas de tiras altas en paralelo.
+# Es el total de la máquina: run_translation_worker lo reparte entre sus workers, porque cada
+# proceso del pool carga sus propios modelos (memoria ≈ modelos × (workers + OCR_POOL_PROCESSES))
+OCR_POOL_PROCESSES = int(os.environ.get('OCR_POOL_PROCESSES', 0))
+
+OCR_POOL_START_METHOD = os.environ.get('OCR_POOL_START_METHOD', 'spawn')
+
+# Detección de texto sobre una copia reducida (lado mayor en px; 0 = resolución original).
+# Elegir el valor con `python manage.py benchmark_ocr_scales <imágenes>`
+OCR_DETECTION_MAX_SIDE = int(os.environ.get('OCR_DETECTION_MAX_SIDE', 0))
+
+# Reconocer sobre los recortes a resolución completa en lugar de sobre la copia reducida
+OCR_RECOGNIZE_FULL_RES = os.environ.get('OCR_RECOGNIZE_FULL_RES', 'true').lower() in ('1', 'true', 'yes')
+
+# OCR en dos etapas: detección de cajas y reconocimiento por lotes de los recortes
+OCR_TWO_STAGE = os.environ.get('OCR_TWO_STAGE', 'true').lower() in ('1', 'true', 'yes')
+
+OCR_RECOGNITION_BATCH_SIZE = int(os.environ.get('OCR_RECOGNITION_BATCH_SIZE', 8))
+
+# Recortes reconocidos que se recuerdan por proceso (0 = sin caché)
+OCR_CROP_CACHE_SIZE = int(os.environ.get('OCR_CROP_CACHE_SIZE', 5000))
+
+# Con source_language='auto', detectar el idioma con un sondeo sobre unos pocos recortes
+# antes del reconocimiento completo, en lugar de leer siempre con el lector coreano
+OCR_AUTO_DETECT_LANGUAGE = os.environ.get('OCR_AUTO_DETECT_LANGUAGE', 'true').lower() in ('1', 'true', 'yes')
+
+OCR_LANGUAGE_PROBE_CROPS = int(os.environ.get('OCR_LANGUAGE_PROBE_CROPS', 8))
+
+# Lado mayor de la copia reducida sobre la que se detectan las cajas del sondeo
+OCR_LANGUAGE_PROBE_MAX_SIDE = int(os.environ.get('OCR_LANGUAGE_PROBE_MAX_SIDE', 1024))
+
+# Confianza media mínima para aceptar el resultado del sondeo sin repetirlo con el lector coreano
+OCR_LANGUAGE_PROBE_MIN_CONFIDENCE = float(os.environ.get('OCR_LANGUAGE_PROBE_MIN_CONFIDENCE', 0.4))
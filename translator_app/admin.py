@@ -1,28 +1,68 @@
 from django.contrib import admin
-from .models import MangaPage
+from .models import Chapter, MangaPage, TranslationJob, TranslationMemoryEntry
+
+class MangaPageInline(admin.TabularInline):
+    model = MangaPage
+    fields = ('page_number', 'title', 'status')
+    readonly_fields = ('status',)
+    extra = 0
+    ordering = ('page_number',)
+
+@admin.register(Chapter)
+class ChapterAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'source_language', 'target_language', 'status', 'created_at')
+    list_filter = ('status', 'source_language', 'target_language', 'created_at')
+    search_fields = ('title',)
+    readonly_fields = ('created_at', 'updated_at', 'translation_context')
+    inlines = [MangaPageInline]
 
 @admin.register(MangaPage)
 class MangaPageAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'source_language', 'target_language', 'status', 'created_at')
     list_filter = ('status', 'source_language', 'target_language', 'created_at')
     search_fields = ('title',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'content_hash', 'perceptual_hash', 'clean_plate_mask_hash')
     fieldsets = (
         ('Información Básica', {
             'fields': ('title', 'original_image', 'translated_image')
         }),
+        ('Capítulo', {
+            'fields': ('chapter', 'page_number')
+        }),
         ('Idiomas', {
             'fields': ('source_language', 'target_language')
         }),
         ('Estado', {
             'fields': ('status',)
         }),
+        ('Deduplicación', {
+            'fields': ('content_hash', 'perceptual_hash'),
+            'classes': ('collapse',)
+        }),
         ('Datos de traducción', {
             'fields': ('detected_text', 'translated_text'),
             'classes': ('collapse',)
         }),
+        ('Renderizado', {
+            'fields': ('clean_plate', 'clean_plate_mask_hash', 'render_plan'),
+            'classes': ('collapse',)
+        }),
         ('Metadatos', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(TranslationJob)
+class TranslationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'manga_page', 'chapter', 'status', 'attempts', 'worker_id', 'lease_expires_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(TranslationMemoryEntry)
+class TranslationMemoryEntryAdmin(admin.ModelAdmin):
+    list_display = ('source_text', 'translated_text', 'source_language', 'target_language', 'model_name', 'hit_count', 'last_used_at')
+    list_filter = ('source_language', 'target_language', 'model_name', 'prompt_version')
+    search_fields = ('source_text', 'translated_text')
+    readonly_fields = ('text_hash', 'created_at', 'last_used_at', 'hit_count')
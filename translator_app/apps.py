@@ -2,6 +2,9 @@ from django.apps import AppConfig
 import os
 import logging
 import sys
+import threading
+
+ASGI_WSGI_SERVERS = ('gunicorn', 'uvicorn', 'daphne', 'hypercorn')
 
 class TranslatorAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -40,4 +43,27 @@ class TranslatorAppConfig(AppConfig):
             
             os.makedirs(uploads_dir, exist_ok=True)
             os.makedirs(results_dir, exist_ok=True)
-            logging.info(f"Directorios de medios creados en: {media_root}")
\ No newline at end of file
+            logging.info(f"Directorios de medios creados en: {media_root}")
+        
+        if self._should_warm_up_ocr():
+            # Precargar los modelos OCR en segundo plano para no retrasar el arranque
+            from .services.ocr_service import warm_up_readers
+            threading.Thread(target=warm_up_readers, name='ocr-warmup', daemon=True).start()
+    
+    def _should_warm_up_ocr(self):
+        """
+        Los procesos web solo precargan OCR si se pide con OCR_WARMUP_IN_WEB
+        
+        Las páginas se procesan en run_translation_worker, que ya precarga sus
+        lectores; nunca se precarga en migrate, shell, etc.
+        """
+        from django.conf import settings
+        if not getattr(settings, 'OCR_WARMUP_IN_WEB', False):
+            return False
+        
+        if 'runserver' in sys.argv:
+            # El autoreloader ejecuta ready() también en el proceso padre
+            return os.environ.get('RUN_MAIN') == 'true'
+        
+        program = os.path.basename(sys.argv[0]) if sys.argv else ''
+        return any(server in program for server in ASGI_WSGI_SERVERS)
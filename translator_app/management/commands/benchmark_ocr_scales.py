@@ -0,0 +1,96 @@
+import time
+
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from translator_app.services.ocr_service import OCRService, clear_crop_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara latencia y exhaustividad del OCR con distintos tamaños de detección "
+        "(OCR_DETECTION_MAX_SIDE) frente a la resolución original"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='+', help="Rutas de páginas de prueba")
+        parser.add_argument(
+            '--max-sides',
+            default='2560,1920,1600,1280,1024',
+            help="Lados mayores a probar, separados por comas",
+        )
+        parser.add_argument('--language', default='auto', help="Idioma de origen de las páginas")
+        parser.add_argument(
+            '--downscaled-recognition',
+            action='store_true',
+            help="Reconocer también sobre la copia reducida (OCR_RECOGNIZE_FULL_RES=false)",
+        )
+        parser.add_argument('--iou', type=float, default=0.5, help="IoU mínimo para emparejar cajas")
+
+    def handle(self, *args, **options):
+        # Sin caché de recortes: con las mismas cajas cada medición leería los textos de la anterior
+        with override_settings(OCR_CROP_CACHE_SIZE=0):
+            self._benchmark(options)
+
+    def _benchmark(self, options):
+        try:
+            max_sides = [int(value) for value in options['max_sides'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError("--max-sides debe ser una lista de enteros")
+        
+        images = []
+        for path in options['images']:
+            image = cv2.imread(path)
+            if image is None:
+                raise CommandError(f"No se pudo leer la imagen {path}")
+            images.append(image)
+        
+        service = OCRService()
+        reader = service.get_reader(options['language'])
+        full_res_recognition = not options['downscaled_recognition']
+        
+        # Calentar el modelo para no cargar la primera medición
+        service._readtext(reader, images[0], max_side=0)
+        
+        reference, reference_time = self._run(service, reader, images, 0, full_res_recognition)
+        self.stdout.write(f"{'lado mayor':>12} {'tiempo (s)':>12} {'aceleración':>12} {'recall':>8} {'texto igual':>12}")
+        self.stdout.write(f"{'original':>12} {reference_time:>12.2f} {1.0:>12.2f} {1.0:>8.3f} {1.0:>12.3f}")
+        
+        for max_side in max_sides:
+            results, elapsed = self._run(service, reader, images, max_side, full_res_recognition)
+            recall, text_agreement = self._compare(service, reference, results, options['iou'])
+            self.stdout.write(
+                f"{max_side:>12} {elapsed:>12.2f} {reference_time / max(elapsed, 1e-6):>12.2f} "
+                f"{recall:>8.3f} {text_agreement:>12.3f}"
+            )
+
+    def _run(self, service, reader, images, max_side, full_res_recognition):
+        clear_crop_cache()
+        results = []
+        started = time.perf_counter()
+        for image in images:
+            results.append(service._readtext(reader, image, max_side=max_side, full_res_recognition=full_res_recognition))
+        return results, time.perf_counter() - started
+
+    def _compare(self, service, reference, results, iou_threshold):
+        """Fracción de cajas de referencia encontradas (IoU) y de ellas con el mismo texto"""
+        total = matched = same_text = 0
+        for reference_page, page in zip(reference, results):
+            rects = [(service._box_rect(bbox), text) for bbox, text, _ in page]
+            for bbox, text, _ in reference_page:
+                total += 1
+                rect = service._box_rect(bbox)
+                best = max(
+                    ((service._overlap_scores(rect, other)[0], other_text) for other, other_text in rects),
+                    default=(0.0, None),
+                    key=lambda candidate: candidate[0],
+                )
+                if best[0] >= iou_threshold:
+                    matched += 1
+                    if best[1].strip().lower() == text.strip().lower():
+                        same_text += 1
+        
+        if not total:
+            return 1.0, 1.0
+        return matched / total, same_text / matched if matched else 0.0
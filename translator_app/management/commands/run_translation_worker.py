@@ -0,0 +1,90 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(worker_id, poll_interval, exit_when_idle, ocr_pool_processes):
+    """Punto de entrada de cada proceso worker"""
+    import django
+    django.setup()
+    
+    from translator_app.services.job_queue import run_worker
+    from translator_app.services.ocr_pool import configure_pool
+    from translator_app.services.ocr_service import warm_up_readers
+    
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_pool(ocr_pool_processes)
+    warm_up_readers()
+    run_worker(worker_id, poll_interval=poll_interval, exit_when_idle=exit_when_idle)
+
+
+class Command(BaseCommand):
+    help = "Ejecuta N procesos worker que consumen la cola de traducciones"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'TRANSLATION_WORKER_PROCESSES', 2),
+            help="Número de procesos worker",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'TRANSLATION_WORKER_POLL_INTERVAL', 2),
+            help="Segundos de espera cuando la cola está vacía",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Vacía la cola y termina en lugar de quedarse esperando trabajos",
+        )
+    
+    def handle(self, *args, **options):
+        num_workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        exit_when_idle = options['once']
+        
+        # OCR_POOL_PROCESSES es el total de la máquina: se reparte entre los workers.
+        # Si no llega a un proceso por worker, el pool se desactiva
+        ocr_pool_total = getattr(settings, 'OCR_POOL_PROCESSES', 0)
+        ocr_pool_processes = ocr_pool_total // num_workers
+        if ocr_pool_total and not ocr_pool_processes:
+            logger.warning(
+                f"OCR_POOL_PROCESSES={ocr_pool_total} no alcanza para {num_workers} workers; pool de OCR desactivado"
+            )
+        
+        # Las conexiones abiertas no deben heredarse entre procesos
+        connections.close_all()
+        
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        processes = []
+        for n in range(num_workers):
+            worker_id = f"{prefix}-{n}"
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(worker_id, poll_interval, exit_when_idle, ocr_pool_processes),
+                name=worker_id,
+            )
+            process.start()
+            processes.append(process)
+        
+        self.stdout.write(self.style.SUCCESS(f"{num_workers} workers de traducción iniciados"))
+        
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo workers...")
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'En ejecución'), ('done', 'Terminado'), ('failed', 'Fallido')], db_index=True, default='queued', max_length=20, verbose_name='Estado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('max_attempts', models.PositiveIntegerField(default=2, verbose_name='Intentos máximos')),
+                ('worker_id', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin de la concesión')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+                ('manga_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='translator_app.mangapage', verbose_name='Página de Manga')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de traducción',
+                'verbose_name_plural': 'Trabajos de traducción',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0002_translationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemoryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64, verbose_name='Hash del texto')),
+                ('source_text', models.TextField(verbose_name='Texto original')),
+                ('translated_text', models.TextField(verbose_name='Texto traducido')),
+                ('source_language', models.CharField(max_length=10, verbose_name='Idioma de origen')),
+                ('target_language', models.CharField(max_length=10, verbose_name='Idioma de destino')),
+                ('model_name', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('prompt_version', models.CharField(max_length=20, verbose_name='Versión del prompt')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='Aciertos')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Último uso')),
+            ],
+            options={
+                'verbose_name': 'Entrada de memoria de traducción',
+                'verbose_name_plural': 'Memoria de traducción',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='translationmemoryentry',
+            constraint=models.UniqueConstraint(fields=('text_hash', 'source_language', 'target_language', 'model_name', 'prompt_version'), name='unique_translation_memory_key'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0003_translationmemoryentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangapage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Hash SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='Hash perceptual'),
+        ),
+    ]
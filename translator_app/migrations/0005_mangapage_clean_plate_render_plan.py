@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import translator_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0004_mangapage_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangapage',
+            name='clean_plate',
+            field=models.ImageField(blank=True, null=True, upload_to=translator_app.models.get_plate_path, verbose_name='Imagen sin texto'),
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='render_plan',
+            field=models.JSONField(blank=True, null=True, verbose_name='Plan de renderizado'),
+        ),
+    ]
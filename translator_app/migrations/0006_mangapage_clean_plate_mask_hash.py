@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0005_mangapage_clean_plate_render_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangapage',
+            name='clean_plate_mask_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Hash de la máscara'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0006_mangapage_clean_plate_mask_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chapter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255, verbose_name='Título')),
+                ('source_language', models.CharField(default='auto', max_length=10, verbose_name='Idioma de origen')),
+                ('target_language', models.CharField(default='es', max_length=10, verbose_name='Idioma de destino')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20, verbose_name='Estado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+            ],
+            options={
+                'verbose_name': 'Capítulo',
+                'verbose_name_plural': 'Capítulos',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='chapter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='translator_app.chapter', verbose_name='Capítulo'),
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='page_number',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Número de página'),
+        ),
+        migrations.AddField(
+            model_name='translationjob',
+            name='chapter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='translator_app.chapter', verbose_name='Capítulo'),
+        ),
+        migrations.AlterField(
+            model_name='translationjob',
+            name='manga_page',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='translator_app.mangapage', verbose_name='Página de Manga'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0007_chapter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='translation_context',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Contexto de traducción'),
+        ),
+    ]
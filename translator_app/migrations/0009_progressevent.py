@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translator_app', '0008_chapter_translation_context'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=20, verbose_name='Etapa')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='Datos')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de creación')),
+                ('manga_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_events', to='translator_app.mangapage', verbose_name='Página de Manga')),
+            ],
+            options={
+                'verbose_name': 'Evento de progreso',
+                'verbose_name_plural': 'Eventos de progreso',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.utils import timezone
 import os
+import json
+import hashlib
 import uuid
 
 def get_upload_path(instance, filename):
@@ -14,6 +17,56 @@ def get_result_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('results', filename)
 
+def compute_mask_hash(regions):
+    """Hash de las cajas de un conjunto de regiones (lo único de lo que depende la máscara de borrado)"""
+    geometries = sorted(
+        json.dumps(region.get('bbox') or region.get('bbox_simple'), sort_keys=True)
+        for region in (regions or [])
+        if isinstance(region, dict)
+    )
+    return hashlib.sha256(json.dumps(geometries).encode('utf-8')).hexdigest()
+
+def get_plate_path(instance, filename):
+    """Genera un path único para guardar la imagen sin texto"""
+    ext = filename.split('.')[-1]
+    filename = f"{uuid.uuid4()}.{ext}"
+    return os.path.join('plates', filename)
+
+class Chapter(models.Model):
+    """Capítulo: grupo ordenado de páginas que se traducen juntas"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+    
+    title = models.CharField(max_length=255, blank=True, verbose_name="Título")
+    source_language = models.CharField(max_length=10, default='auto', verbose_name="Idioma de origen")
+    target_language = models.CharField(max_length=10, default='es', verbose_name="Idioma de destino")
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Estado"
+    )
+    
+    # Resumen acumulado y últimas líneas traducidas, compartidos entre las páginas del capítulo
+    translation_context = models.JSONField(default=dict, blank=True, verbose_name="Contexto de traducción")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+    
+    def __str__(self):
+        return f"{self.title or 'Capítulo sin título'} - {self.get_status_display()}"
+    
+    class Meta:
+        verbose_name = "Capítulo"
+        verbose_name_plural = "Capítulos"
+        ordering = ['-created_at']
+
 class MangaPage(models.Model):
     """Modelo para almacenar la página de manga y su traducción"""
     
@@ -37,6 +90,15 @@ class MangaPage(models.Model):
     ]
     
     title = models.CharField(max_length=255, blank=True, verbose_name="Título")
+    chapter = models.ForeignKey(
+        Chapter,
+        on_delete=models.CASCADE,
+        related_name='pages',
+        blank=True,
+        null=True,
+        verbose_name="Capítulo"
+    )
+    page_number = models.PositiveIntegerField(blank=True, null=True, verbose_name="Número de página")
     original_image = models.ImageField(upload_to=get_upload_path, verbose_name="Imagen Original")
     translated_image = models.ImageField(upload_to=get_result_path, blank=True, null=True, verbose_name="Imagen Traducida")
     
@@ -61,16 +123,145 @@ class MangaPage(models.Model):
         verbose_name="Estado"
     )
     
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Hash SHA-256")
+    perceptual_hash = models.CharField(max_length=16, blank=True, db_index=True, verbose_name="Hash perceptual")
+    
     detected_text = models.JSONField(blank=True, null=True, verbose_name="Texto detectado")
     translated_text = models.JSONField(blank=True, null=True, verbose_name="Texto traducido")
     
+    clean_plate = models.ImageField(upload_to=get_plate_path, blank=True, null=True, verbose_name="Imagen sin texto")
+    clean_plate_mask_hash = models.CharField(max_length=64, blank=True, verbose_name="Hash de la máscara")
+    render_plan = models.JSONField(blank=True, null=True, verbose_name="Plan de renderizado")
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
     
     def __str__(self):
         return f"{self.title or 'Sin título'} - {self.get_status_display()}"
     
+    def clean_plate_is_stale(self):
+        """La imagen sin texto deja de valer si cambian las cajas de detected_text"""
+        return bool(self.clean_plate) and self.clean_plate_mask_hash != compute_mask_hash(self.detected_text)
+    
+    def save(self, *args, **kwargs):
+        if self.clean_plate_is_stale():
+            self.clean_plate.delete(save=False)
+            self.clean_plate_mask_hash = ''
+            self.render_plan = None
+            
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'clean_plate', 'clean_plate_mask_hash', 'render_plan'}
+        
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = "Página de Manga"
         verbose_name_plural = "Páginas de Manga"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class TranslationJob(models.Model):
+    """Trabajo en cola para procesar una página de manga fuera del ciclo de la petición"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+    
+    manga_page = models.ForeignKey(
+        MangaPage,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        blank=True,
+        null=True,
+        verbose_name="Página de Manga"
+    )
+    
+    chapter = models.ForeignKey(
+        Chapter,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        blank=True,
+        null=True,
+        verbose_name="Capítulo"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        db_index=True,
+        verbose_name="Estado"
+    )
+    
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    max_attempts = models.PositiveIntegerField(default=2, verbose_name="Intentos máximos")
+    worker_id = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    lease_expires_at = models.DateTimeField(blank=True, null=True, verbose_name="Fin de la concesión")
+    last_error = models.TextField(blank=True, verbose_name="Último error")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+    
+    def __str__(self):
+        if self.chapter_id:
+            return f"Trabajo {self.id} ({self.get_status_display()}) - capítulo {self.chapter_id}"
+        return f"Trabajo {self.id} ({self.get_status_display()}) - página {self.manga_page_id}"
+    
+    class Meta:
+        verbose_name = "Trabajo de traducción"
+        verbose_name_plural = "Trabajos de traducción"
+        ordering = ['created_at']
+
+
+class TranslationMemoryEntry(models.Model):
+    """Traducción ya obtenida del LLM, reutilizable para el mismo texto de origen normalizado"""
+    
+    text_hash = models.CharField(max_length=64, verbose_name="Hash del texto")
+    source_text = models.TextField(verbose_name="Texto original")
+    translated_text = models.TextField(verbose_name="Texto traducido")
+    source_language = models.CharField(max_length=10, verbose_name="Idioma de origen")
+    target_language = models.CharField(max_length=10, verbose_name="Idioma de destino")
+    model_name = models.CharField(max_length=100, verbose_name="Modelo")
+    prompt_version = models.CharField(max_length=20, verbose_name="Versión del prompt")
+    
+    hit_count = models.PositiveIntegerField(default=0, verbose_name="Aciertos")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Último uso")
+    
+    def __str__(self):
+        return f"{self.source_text[:50]} → {self.translated_text[:50]}"
+    
+    class Meta:
+        verbose_name = "Entrada de memoria de traducción"
+        verbose_name_plural = "Memoria de traducción"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['text_hash', 'source_language', 'target_language', 'model_name', 'prompt_version'],
+                name='unique_translation_memory_key',
+            ),
+        ]
+
+
+class ProgressEvent(models.Model):
+    """Evento de progreso de una página (decodificada, OCR, traducción, borrado, renderizado), servido por SSE"""
+    
+    manga_page = models.ForeignKey(
+        MangaPage,
+        on_delete=models.CASCADE,
+        related_name='progress_events',
+        verbose_name="Página de Manga"
+    )
+    stage = models.CharField(max_length=20, verbose_name="Etapa")
+    data = models.JSONField(default=dict, blank=True, verbose_name="Datos")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Fecha de creación")
+    
+    def __str__(self):
+        return f"Página {self.manga_page_id} - {self.stage}"
+    
+    class Meta:
+        verbose_name = "Evento de progreso"
+        verbose_name_plural = "Eventos de progreso"
+        ordering = ['id']
@@ -0,0 +1,340 @@
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.db import connection
+
+from ..models import Chapter
+from .deepseek_api import DeepseekAPIService
+from .image_processor import ImageProcessor
+from .ocr_pool import get_ocr_pool
+from .ocr_service import OCRService
+from .translation_context import TranslationContext
+from .translation_pipeline import (
+    complete_page_without_text,
+    mark_page_failed,
+    run_ocr_stage,
+    run_render_stage,
+    run_translation_stage,
+    run_translation_stage_many,
+    start_page_processing,
+)
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de cola entre etapas
+_DONE = object()
+
+
+class _PageWork:
+    """Estado de una página mientras recorre las etapas del pipeline"""
+
+    def __init__(self, manga_page, index):
+        self.manga_page = manga_page
+        self.index = index
+        self.page = None
+        self.text_regions = None
+        self.translated_regions = None
+
+
+class ChapterPipeline:
+    """
+    Pipeline por etapas para un capítulo: OCR → traducción → renderizado
+    
+    Cada etapa tiene sus propios hilos y se comunica con la siguiente mediante
+    colas acotadas, de modo que el OCR de la página N+1 se solapa con la
+    traducción (limitada por la red) de la página N y con el renderizado de la
+    N-1. Un fallo en una página no detiene las demás; su estado final lo decide
+    fail_job al terminar el capítulo, según queden o no intentos.
+    
+    Con un ``context`` (TranslationContext) la traducción pasa a un único hilo
+    y un búfer le entrega las páginas en orden de lectura aunque el OCR (con
+    varios hilos o el pool) las termine desordenadas; las páginas que ya esperan
+    se traducen juntas (hasta CHAPTER_CONTEXT_BATCH_PAGES) en las mismas peticiones.
+    """
+
+    def __init__(self, ocr_workers=None, translate_workers=None, render_workers=None, queue_size=None,
+                 context=None, on_context_update=None):
+        self.ocr_workers = max(1, ocr_workers or getattr(settings, 'CHAPTER_PIPELINE_OCR_WORKERS', 1))
+        self.translate_workers = max(1, translate_workers or getattr(settings, 'CHAPTER_PIPELINE_TRANSLATE_WORKERS', 2))
+        self.render_workers = max(1, render_workers or getattr(settings, 'CHAPTER_PIPELINE_RENDER_WORKERS', 1))
+        self.queue_size = max(1, queue_size or getattr(settings, 'CHAPTER_PIPELINE_QUEUE_SIZE', 2))
+        
+        self.context = context
+        self.on_context_update = on_context_update
+        self.translate_batch_pages = 1
+        if context is not None:
+            self.translate_workers = 1
+            self.translate_batch_pages = max(1, getattr(settings, 'CHAPTER_CONTEXT_BATCH_PAGES', 3))
+            # Dejar que se acumulen en la cola las páginas que se traducen juntas
+            self.queue_size = max(self.queue_size, self.translate_batch_pages)
+        
+        self.deepseek_service = DeepseekAPIService()
+        self.image_processor = ImageProcessor()
+        
+        # Con el pool de OCR cada hilo de la etapa delega una página en un proceso distinto
+        self.ocr_pool = get_ocr_pool()
+        self.ocr_service = self.ocr_pool or OCRService()
+        if self.ocr_pool is not None:
+            self.ocr_workers = max(self.ocr_workers, self.ocr_pool.processes)
+        
+        self._lock = threading.Lock()
+        self._completed = []
+        self._failed = []
+        
+        # Búfer de reordenación de la etapa de traducción cuando hay contexto
+        self._finished_indexes = set()
+        self._reorder_buffer = {}
+        self._next_index = 0
+        self._reorder_done = False
+
+    def _ocr(self, work):
+        # Las páginas idénticas a otras ya traducidas se completan aquí mismo
+        if not start_page_processing(work.manga_page):
+            return None
+        work.page, work.text_regions = run_ocr_stage(work.manga_page, ocr_service=self.ocr_service)
+        if not work.text_regions:
+            complete_page_without_text(work.manga_page)
+            return None
+        return work
+
+    def _translate(self, works):
+        if len(works) == 1:
+            works[0].translated_regions = run_translation_stage(
+                works[0].manga_page, works[0].text_regions, self.deepseek_service, self.context
+            )
+        else:
+            results = run_translation_stage_many(
+                [work.manga_page for work in works],
+                [work.text_regions for work in works],
+                self.deepseek_service,
+                self.context
+            )
+            for work, translated_regions in zip(works, results):
+                work.translated_regions = translated_regions
+        
+        if self.context is not None and self.on_context_update:
+            self.on_context_update(self.context)
+        return works
+
+    def _render(self, work):
+        run_render_stage(work.manga_page, work.page, work.translated_regions, self.image_processor)
+        # Liberar la imagen decodificada en cuanto la página termina
+        work.page = None
+        return None
+
+    def _finish(self, work, on_page_done, error=None):
+        with self._lock:
+            (self._failed if error else self._completed).append(work.manga_page.id)
+            self._finished_indexes.add(work.index)
+        
+        if error:
+            mark_page_failed(work.manga_page, error)
+        
+        if on_page_done:
+            try:
+                on_page_done(work.manga_page)
+            except Exception as e:
+                logger.warning(f"Error en la notificación de progreso del capítulo: {str(e)}")
+
+    def _take_batch(self, in_queue, batch_size):
+        """Toma una página (bloqueando) y las que ya esperan, hasta batch_size; indica si llegó el fin"""
+        work = in_queue.get()
+        if work is _DONE:
+            return [], True
+        
+        works = [work]
+        while len(works) < batch_size:
+            try:
+                work = in_queue.get_nowait()
+            except queue.Empty:
+                break
+            if work is _DONE:
+                return works, True
+            works.append(work)
+        
+        return works, False
+
+    def _buffer_work(self, work):
+        if work is _DONE:
+            self._reorder_done = True
+        else:
+            self._reorder_buffer[work.index] = work
+
+    def _pop_in_order(self, batch_size):
+        """Saca del búfer las páginas consecutivas a partir de la siguiente esperada, hasta batch_size"""
+        ready = []
+        while len(ready) < batch_size:
+            with self._lock:
+                finished = self._next_index in self._finished_indexes
+            
+            if self._next_index in self._reorder_buffer:
+                ready.append(self._reorder_buffer.pop(self._next_index))
+                self._next_index += 1
+            elif finished:
+                # Reutilizada, sin texto o fallida en el OCR: no pasa por la traducción
+                self._next_index += 1
+            elif self._reorder_done and self._reorder_buffer:
+                # El OCR ya terminó: ninguna página anterior puede llegar
+                self._next_index = min(self._reorder_buffer)
+            else:
+                break
+        return ready
+
+    def _take_ordered_batch(self, in_queue, batch_size):
+        """
+        Como _take_batch, pero entrega las páginas en orden de lectura
+        
+        Con varios hilos (o procesos) de OCR las páginas llegan desordenadas;
+        las adelantadas esperan en un búfer hasta que llega la siguiente
+        esperada, para que el contexto del capítulo avance en orden.
+        """
+        while True:
+            while not self._reorder_done:
+                try:
+                    self._buffer_work(in_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            ready = self._pop_in_order(batch_size)
+            if ready:
+                return ready, self._reorder_done and not self._reorder_buffer
+            if self._reorder_done:
+                return [], True
+            
+            self._buffer_work(in_queue.get())
+
+    def _stage_worker(self, name, func, in_queue, out_queue, stage_state, on_page_done, batch_size=None,
+                      ordered=False):
+        take_batch = self._take_ordered_batch if ordered else self._take_batch
+        try:
+            stopping = False
+            while not stopping:
+                works, stopping = take_batch(in_queue, batch_size or 1)
+                if not works:
+                    break
+                
+                # Las etapas por lotes reciben la lista completa; el resto, página a página
+                if batch_size:
+                    works.sort(key=lambda work: (work.manga_page.page_number or 0, work.manga_page.id))
+                    try:
+                        results = func(works)
+                    except Exception as e:
+                        logger.error(f"Etapa '{name}' falló en las páginas {[work.manga_page.id for work in works]}")
+                        for work in works:
+                            self._finish(work, on_page_done, error=e)
+                        continue
+                    batch = list(zip(works, results))
+                else:
+                    batch = []
+                    for work in works:
+                        try:
+                            batch.append((work, func(work)))
+                        except Exception as e:
+                            logger.error(f"Etapa '{name}' falló en la página {work.manga_page.id}")
+                            self._finish(work, on_page_done, error=e)
+                
+                for work, result in batch:
+                    if result is None:
+                        self._finish(work, on_page_done)
+                    else:
+                        out_queue.put(result)
+        finally:
+            # Cada hilo usa su propia conexión a la base de datos
+            connection.close()
+            
+            # El último hilo de la etapa avisa a todos los hilos de la siguiente
+            with self._lock:
+                stage_state['remaining'] -= 1
+                last = stage_state['remaining'] == 0
+            if last and out_queue is not None:
+                for _ in range(stage_state['next_workers']):
+                    out_queue.put(_DONE)
+
+    def run(self, manga_pages, on_page_done=None):
+        """
+        Procesa las páginas en orden y espera a que terminen todas
+        
+        Args:
+            manga_pages (list): Páginas (MangaPage) del capítulo
+            on_page_done (callable): Se llama con cada página al completarse o fallar
+        
+        Returns:
+            dict: {'completed': [ids], 'failed': [ids]}
+        """
+        # Con contexto, la traducción (un único hilo) recibe las páginas en orden de lectura
+        ordered = self.context is not None
+        stages = [
+            ('ocr', self._ocr, self.ocr_workers, None, False),
+            ('translate', self._translate, self.translate_workers, self.translate_batch_pages, ordered),
+            ('render', self._render, self.render_workers, None, False),
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        
+        threads = []
+        for index, (name, func, workers, batch_size, stage_ordered) in enumerate(stages):
+            next_queue = queues[index + 1] if index + 1 < len(stages) else None
+            stage_state = {
+                'remaining': workers,
+                'next_workers': stages[index + 1][2] if next_queue is not None else 0,
+            }
+            for number in range(workers):
+                thread = threading.Thread(
+                    target=self._stage_worker,
+                    args=(name, func, queues[index], next_queue, stage_state, on_page_done, batch_size, stage_ordered),
+                    name=f"chapter-{name}-{number}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+        
+        for index, manga_page in enumerate(manga_pages):
+            queues[0].put(_PageWork(manga_page, index))
+        for _ in range(self.ocr_workers):
+            queues[0].put(_DONE)
+        
+        for thread in threads:
+            thread.join()
+        
+        return {'completed': list(self._completed), 'failed': list(self._failed)}
+
+
+def process_chapter(chapter_id, on_page_done=None):
+    """
+    Traduce todas las páginas pendientes de un capítulo con el pipeline por etapas
+    
+    Las páginas ya completadas se omiten, así que reintentar el trabajo solo
+    procesa las que faltan.
+    
+    Raises:
+        RuntimeError: si alguna página falló, para que fail_job reencole el trabajo
+    """
+    chapter = Chapter.objects.get(id=chapter_id)
+    chapter.status = 'processing'
+    chapter.save(update_fields=['status', 'updated_at'])
+    
+    manga_pages = list(chapter.pages.exclude(status='completed').order_by('page_number', 'id'))
+    logger.info(f"Capítulo {chapter.id}: {len(manga_pages)} páginas por procesar")
+    
+    context = None
+    if getattr(settings, 'CHAPTER_CONTEXT_ENABLED', True):
+        # Se retoma el contexto guardado si el trabajo se reintenta
+        context = TranslationContext.from_dict(chapter.translation_context)
+    
+    def save_context(context):
+        Chapter.objects.filter(id=chapter.id).update(translation_context=context.to_dict())
+    
+    pipeline = ChapterPipeline(context=context, on_context_update=save_context)
+    result = pipeline.run(manga_pages, on_page_done=on_page_done)
+    
+    chapter.status = 'failed' if result['failed'] else 'completed'
+    chapter.save(update_fields=['status', 'updated_at'])
+    
+    logger.info(
+        f"Capítulo {chapter.id} terminado: {len(result['completed'])} páginas completadas, "
+        f"{len(result['failed'])} fallidas"
+    )
+    
+    if result['failed']:
+        raise RuntimeError(f"Fallaron {len(result['failed'])} páginas del capítulo {chapter.id}: {result['failed']}")
+    return result
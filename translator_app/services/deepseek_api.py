@@ -1,14 +1,44 @@
 import logging
 import re
 import os
-from openai import OpenAI
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from dotenv import load_dotenv
 
+from . import translation_memory
+from .llm_router import get_router
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+LANGUAGE_NAMES = {
+    'es': 'español',
+    'en': 'inglés',
+    'ja': 'japonés',
+    'ko': 'coreano',
+    'zh': 'chino',
+}
+
+# Incrementar al cambiar los prompts para no reutilizar traducciones de la memoria hechas con prompts anteriores
+PROMPT_VERSION = '3'
+
+SEGMENT_PATTERN = re.compile(r'^\s*\[(\d+)\]\s*(.*)$')
+
+SUMMARY_PATTERN = re.compile(r'^\s*\[RESUMEN\]\s*(.*)$')
+
+SPECIAL_CASES = {
+    "!?": "¡¿?!",
+    "!": "¡!",
+    "?": "¿?",
+    ".": ".",
+    "...": "...",
+    "'": "'",
+    "": ""
+}
+
 class DeepseekAPIService:
     def __init__(self):
         self.api_key = os.environ.get("OPENROUTER_API_KEY")
@@ -16,15 +46,15 @@ class DeepseekAPIService:
         self.default_model = os.environ.get("DEFAULT_MODEL", "anthropic/claude-3-haiku")
         self.default_temperature = float(os.environ.get("DEFAULT_TEMPERATURE", 0.2))
         self.default_max_tokens = int(os.environ.get("DEFAULT_MAX_TOKENS", 200))
+        self.batch_mode = os.environ.get("TRANSLATION_BATCH_MODE", "true").lower() in ("1", "true", "yes")
+        self.batch_token_budget = int(os.environ.get("TRANSLATION_BATCH_TOKEN_BUDGET", 1500))
+        self.max_concurrency = max(1, int(os.environ.get("TRANSLATION_MAX_CONCURRENCY", 4)))
         
+        # Router compartido por todo el proceso: elige proveedor por latencia y reutiliza sus conexiones
         try:
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url
-            )
-            logger.info(f"Cliente OpenAI inicializado con OpenRouter, API KEY: {self.api_key[:10] if self.api_key else 'No disponible'}...")
+            self.client = get_router()
         except Exception as e:
-            logger.error(f"Error al inicializar cliente OpenAI: {str(e)}")
+            logger.error(f"Error al inicializar los proveedores de LLM: {str(e)}")
             self.client = None
     
     def clean_ocr_text(self, text):
@@ -86,111 +116,493 @@ class DeepseekAPIService:
         matches = re.findall(name_pattern, text)
         return matches[0] if matches else None
     
+    def _translation_messages(self, text, target_lang='es'):
+        target_name = LANGUAGE_NAMES.get(target_lang, target_lang)
+        prompt = f"""Traduce literalmente este texto al {target_name}, conservando:
+    - La estructura original de las frases
+    - Todos los matices emocionales
+    - Puntuación y estilo
+    - Nombres propios
+
+    Texto original: "{text}"
+
+    Traducción:"""
+        
+        return [
+            {
+                "role": "system", 
+                "content": "Eres un traductor preciso que mantiene la estructura y emoción del texto original."
+            },
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _parse_translation_response(self, response):
+        if response and response.choices and len(response.choices) > 0:
+            translated_text = response.choices[0].message.content
+            cleaned_text = self.clean_translation(translated_text)
+            
+            logger.info(f"Traducción: '{translated_text}' → Limpia: '{cleaned_text}'")
+            return cleaned_text
+        
+        return None
+    
+    def _request_translation(self, text, target_lang='es'):
+        """
+        Pide al LLM la traducción de un texto ya limpio
+        
+        Returns:
+            tuple: (traducción o None si la respuesta no trae texto, modelo que respondió)
+        """
+        logger.info(f"Enviando solicitud de traducción para: '{text}'")
+        
+        response, provider = self.client.route(
+            messages=self._translation_messages(text, target_lang),
+            temperature=0.1,
+            max_tokens=self.default_max_tokens
+        )
+        
+        return self._parse_translation_response(response), provider.model
+    
+    async def _arequest_translation(self, text, target_lang='es'):
+        """Versión asíncrona de _request_translation, con los clientes compartidos del bucle"""
+        logger.info(f"Enviando solicitud de traducción asíncrona para: '{text}'")
+        
+        response, provider = await self.client.aroute(
+            messages=self._translation_messages(text, target_lang),
+            temperature=0.1,
+            max_tokens=self.default_max_tokens
+        )
+        
+        return self._parse_translation_response(response), provider.model
+    
+    def _memory_lookup(self, texts, source_lang, target_lang):
+        # Vale la traducción de cualquiera de los modelos configurados en el router
+        models = self.client.models() if self.client else [self.default_model]
+        return translation_memory.lookup_many(texts, source_lang, target_lang, models, PROMPT_VERSION)
+    
+    def _memory_store(self, translations, source_lang, target_lang):
+        """Guarda {texto: (traducción, modelo que la generó)} con el modelo real de cada entrada"""
+        by_model = {}
+        for text, (translated, model_name) in translations.items():
+            if translated:
+                by_model.setdefault(model_name, {})[text] = translated
+        
+        for model_name, model_translations in by_model.items():
+            translation_memory.store_many(model_translations, source_lang, target_lang, model_name, PROMPT_VERSION)
+    
     def translate_text(self, text, source_lang='auto', target_lang='es'):
         if not text:
             logger.warning("Se intentó traducir texto vacío")
             return {'translated_text': ''}
         
+        text = self.clean_ocr_text(text)
+        
+        cached = self._memory_lookup([text], source_lang, target_lang).get(translation_memory.normalize_text(text))
+        if cached is not None:
+            logger.info(f"Traducción recuperada de memoria para: '{text}'")
+            return {
+                'translated_text': cached,
+                'source_language': source_lang,
+                'target_language': target_lang
+            }
+        
         if not self.client:
             logger.error("Cliente OpenAI no inicializado correctamente")
             return {'translated_text': f"Error: No se pudo traducir '{text}'"}
         
         try:
-            text = self.clean_ocr_text(text)
-            
-            prompt = f"""Traduce literalmente este texto al español, conservando:
+            cleaned_text, model_name = self._request_translation(text, target_lang)
+        except Exception as e:
+            logger.error(f"Error al traducir: {str(e)}")
+            return {'translated_text': f"Error: {str(e)}"}
+        
+        if cleaned_text is None:
+            logger.warning("Respuesta sin texto traducido")
+            return {'translated_text': f"Error: No se pudo traducir '{text}'"}
+        
+        self._memory_store({text: (cleaned_text, model_name)}, source_lang, target_lang)
+        return {
+            'translated_text': cleaned_text,
+            'source_language': source_lang,
+            'target_language': target_lang
+        }
+    
+    async def atranslate_text(self, text, source_lang='auto', target_lang='es'):
+        """
+        Versión asíncrona de translate_text para vistas ASGI
+        
+        La petición al LLM no ocupa ningún hilo mientras espera; la memoria de
+        traducción se consulta en el hilo del ORM con sync_to_async.
+        """
+        if not text:
+            logger.warning("Se intentó traducir texto vacío")
+            return {'translated_text': ''}
+        
+        text = self.clean_ocr_text(text)
+        
+        found = await sync_to_async(self._memory_lookup)([text], source_lang, target_lang)
+        cached = found.get(translation_memory.normalize_text(text))
+        if cached is not None:
+            logger.info(f"Traducción recuperada de memoria para: '{text}'")
+            return {
+                'translated_text': cached,
+                'source_language': source_lang,
+                'target_language': target_lang
+            }
+        
+        try:
+            cleaned_text, model_name = await self._arequest_translation(text, target_lang)
+        except Exception as e:
+            logger.error(f"Error al traducir: {str(e)}")
+            return {'translated_text': f"Error: {str(e)}"}
+        
+        if cleaned_text is None:
+            logger.warning("Respuesta sin texto traducido")
+            return {'translated_text': f"Error: No se pudo traducir '{text}'"}
+        
+        await sync_to_async(self._memory_store)({text: (cleaned_text, model_name)}, source_lang, target_lang)
+        return {
+            'translated_text': cleaned_text,
+            'source_language': source_lang,
+            'target_language': target_lang
+        }
+    
+    def _map_concurrently(self, func, items, on_result=None):
+        """
+        Aplica ``func`` a cada elemento con como máximo TRANSLATION_MAX_CONCURRENCY peticiones en vuelo, conservando el orden
+        
+        ``on_result(item, result)`` se llama en el hilo que invoca, a medida que llegan los resultados.
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_concurrency == 1:
+            results = (func(item) for item in items)
+            return self._collect(items, results, on_result)
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return self._collect(items, executor.map(func, items), on_result)
+    
+    def _collect(self, items, results, on_result):
+        collected = []
+        for item, result in zip(items, results):
+            collected.append(result)
+            if on_result:
+                on_result(item, result)
+        return collected
+    
+    def _progress_reporter(self, cleaned, pending, on_progress):
+        """
+        Devuelve una función que suma al progreso los textos ya resueltos
+        
+        El progreso se cuenta en textos de entrada (k de N), incluidos los
+        repetidos y los recuperados de memoria, que cuentan desde el principio.
+        """
+        if not on_progress:
+            return lambda resolved: None
+        
+        counts = Counter(cleaned)
+        state = {'done': len(cleaned) - sum(counts[text] for text in set(pending))}
+        on_progress(state['done'], len(cleaned))
+        
+        def report(resolved):
+            state['done'] += sum(counts[text] for text in resolved)
+            on_progress(state['done'], len(cleaned))
+        
+        return report
+    
+    def _unique_misses(self, cleaned, cached):
+        """Textos no vacíos sin traducción en memoria, sin repetir"""
+        misses = []
+        for text in cleaned:
+            if text and translation_memory.normalize_text(text) not in cached and text not in misses:
+                misses.append(text)
+        return misses
+    
+    def translate_texts(self, texts, source_lang='auto', target_lang='es', on_progress=None):
+        """
+        Traduce cada texto con una petición propia, en paralelo; devuelve las traducciones en orden
+        
+        Los textos presentes en la memoria de traducción (o repetidos en la
+        lista) no generan peticiones adicionales. ``on_progress(k, N)`` informa
+        del avance a medida que llegan las respuestas.
+        """
+        cleaned = [self.clean_ocr_text(text) for text in texts]
+        cached = self._memory_lookup(cleaned, source_lang, target_lang)
+        misses = self._unique_misses(cleaned, cached)
+        report = self._progress_reporter(cleaned, misses if self.client else [], on_progress)
+        
+        def request_one(text):
+            try:
+                return self._request_translation(text, target_lang)
+            except Exception as e:
+                logger.error(f"Error al traducir: {str(e)}")
+                return None, None
+        
+        results = {}
+        if misses and self.client:
+            served = dict(zip(misses, self._map_concurrently(request_one, misses, lambda text, _: report([text]))))
+            self._memory_store(served, source_lang, target_lang)
+            results = {text: translated for text, (translated, _) in served.items()}
+        
+        translations = []
+        for original, text in zip(texts, cleaned):
+            if not text:
+                translations.append(original)
+            elif translation_memory.normalize_text(text) in cached:
+                translations.append(cached[translation_memory.normalize_text(text)])
+            elif results.get(text):
+                translations.append(results[text])
+            else:
+                translations.append(f"Error: No se pudo traducir '{text}'")
+        
+        return translations
+    
+    def _estimate_tokens(self, text):
+        # Aproximación conservadora: los textos CJK rondan un token por carácter
+        return len(text) // 2 + 4
+    
+    def _chunk_by_token_budget(self, texts):
+        chunks = []
+        current = []
+        current_tokens = 0
+        
+        for index, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if current and current_tokens + tokens > self.batch_token_budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+        
+        if current:
+            chunks.append(current)
+        
+        return chunks
+    
+    def _split_summary(self, content):
+        """Separa la línea [RESUMEN] de la respuesta; devuelve (resto, resumen)"""
+        lines = []
+        summary = None
+        for line in content.splitlines():
+            match = SUMMARY_PATTERN.match(line)
+            if match:
+                summary = match.group(1).strip()
+            else:
+                lines.append(line)
+        return "\n".join(lines), summary
+    
+    def _parse_numbered_segments(self, content):
+        segments = {}
+        current_number = None
+        
+        for line in content.splitlines():
+            match = SEGMENT_PATTERN.match(line)
+            if match:
+                current_number = int(match.group(1))
+                segments[current_number] = match.group(2).strip()
+            elif current_number is not None and line.strip():
+                segments[current_number] = f"{segments[current_number]} {line.strip()}".strip()
+        
+        return segments
+    
+    def _translate_chunk(self, texts, source_lang, target_lang, context=None):
+        """
+        Traduce varios segmentos en una sola petición; devuelve ({posición: traducción}, modelo que respondió)
+        
+        Con ``context`` el contexto del capítulo se envía una vez en la petición y
+        el modelo devuelve además un resumen actualizado, que se guarda en él.
+        """
+        target_name = LANGUAGE_NAMES.get(target_lang, target_lang)
+        numbered = "\n".join(f"[{n}] {text}" for n, text in enumerate(texts, start=1))
+        
+        context_block = ""
+        summary_instruction = ""
+        if context is not None:
+            rendered = context.render()
+            if rendered:
+                context_block = f"""Contexto del capítulo (solo como referencia, no lo traduzcas):
+    {rendered}
+
+    """
+            summary_instruction = """
+    Después, en una última línea que empiece por [RESUMEN], escribe un resumen actualizado del capítulo (máximo 60 palabras) con personajes, nombres y términos a mantener."""
+        
+        prompt = f"""{context_block}Traduce literalmente al {target_name} cada uno de estos textos de una página de manga, conservando:
     - La estructura original de las frases
     - Todos los matices emocionales
     - Puntuación y estilo
     - Nombres propios
 
-    Texto original: "{text}"
+    Responde solo con las traducciones, una por línea, con el mismo número entre corchetes que el original.{summary_instruction}
 
-    Traducción:"""
+    {numbered}"""
+        
+        expected_tokens = sum(self._estimate_tokens(text) for text in texts) * 2
+        if context is not None:
+            expected_tokens += 120
+        
+        response, provider = self.client.route(
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Eres un traductor preciso que mantiene la estructura y emoción del texto original."
+                },
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=max(self.default_max_tokens, expected_tokens)
+        )
+        
+        if not (response and response.choices):
+            return {}, provider.model
+        
+        content, summary = self._split_summary(response.choices[0].message.content or '')
+        if context is not None and summary:
+            context.update_summary(summary)
+        
+        segments = self._parse_numbered_segments(content)
+        
+        return {
+            n - 1: self.clean_translation(segment)
+            for n, segment in segments.items()
+            if 1 <= n <= len(texts) and segment
+        }, provider.model
+    
+    def translate_batch(self, texts, source_lang='auto', target_lang='es', context=None, on_progress=None):
+        """
+        Traduce una lista de textos agrupándolos en peticiones según TRANSLATION_BATCH_TOKEN_BUDGET
+        
+        Los segmentos que no se puedan recuperar de la respuesta se traducen de
+        forma individual con translate_texts. Con ``context`` (TranslationContext)
+        las traducciones obtenidas se añaden a sus líneas recientes y los lotes se
+        envían en orden, de uno en uno, para que el resumen avance de lote en lote.
+        ``on_progress(k, N)`` se llama al terminar cada lote.
+        
+        Returns:
+            list: traducciones en el mismo orden que ``texts``
+        """
+        cleaned = [self.clean_ocr_text(text) for text in texts]
+        cached = self._memory_lookup(cleaned, source_lang, target_lang)
+        to_send = self._unique_misses(cleaned, cached)
+        report = self._progress_reporter(cleaned, to_send if self.client else [], on_progress)
+        results = {}
+        
+        if to_send and self.client:
+            chunks = self._chunk_by_token_budget(to_send)
             
-            logger.info(f"Enviando solicitud de traducción para: '{text}'")
+            def translate_chunk(chunk):
+                try:
+                    chunk_results, model_name = self._translate_chunk([to_send[i] for i in chunk], source_lang, target_lang, context)
+                except Exception as e:
+                    logger.error(f"Error en la traducción por lotes: {str(e)}")
+                    chunk_results, model_name = {}, None
+                logger.info(f"Lote de {len(chunk)} segmentos traducido ({len(chunk_results)} recuperados)")
+                return chunk_results, model_name
             
-            response = self.client.chat.completions.create(
-                model=self.default_model,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Eres un traductor preciso que mantiene la estructura y emoción del texto original."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=self.default_max_tokens
-            )
+            def chunk_report(chunk, _):
+                report([to_send[i] for i in chunk])
             
-            if response and response.choices and len(response.choices) > 0:
-                translated_text = response.choices[0].message.content
-                cleaned_text = self.clean_translation(translated_text)
-                
-                logger.info(f"Traducción: '{translated_text}' → Limpia: '{cleaned_text}'")
-                return {
-                    'translated_text': cleaned_text,
-                    'source_language': source_lang,
-                    'target_language': target_lang
-                }
+            if context is None:
+                chunk_results_list = self._map_concurrently(translate_chunk, chunks, chunk_report)
             else:
-                logger.warning("Respuesta sin texto traducido")
-                return {'translated_text': f"Error: No se pudo traducir '{text}'"}
-                
-        except Exception as e:
-            logger.error(f"Error al traducir: {str(e)}")
-            return {'translated_text': f"Error: {str(e)}"}
-    
-    def translate_manga_text(self, text_regions, source_lang='auto', target_lang='es'):
-        text_items = [(i, region.get('text', '')) for i, region in enumerate(text_regions) if region.get('text')]
+                # Con contexto los lotes van de uno en uno: cada uno recibe el resumen que actualizó el anterior
+                chunk_results_list = self._collect(chunks, (translate_chunk(chunk) for chunk in chunks), chunk_report)
+            
+            served = {}
+            for chunk, (chunk_results, model_name) in zip(chunks, chunk_results_list):
+                for position, index in enumerate(chunk):
+                    if chunk_results.get(position):
+                        results[to_send[index]] = chunk_results[position]
+                        served[to_send[index]] = (chunk_results[position], model_name)
+            
+            self._memory_store(served, source_lang, target_lang)
         
-        if not text_items:
-            logger.warning("No hay textos para traducir")
-            return text_regions
+        translations = []
+        for original, text in zip(texts, cleaned):
+            if not text:
+                translations.append(original)
+            elif translation_memory.normalize_text(text) in cached:
+                translations.append(cached[translation_memory.normalize_text(text)])
+            else:
+                translations.append(results.get(text))
         
-        special_cases = {
-            "!?": "¡¿?!",
-            "!": "¡!",
-            "?": "¿?",
-            ".": ".",
-            "...": "...",
-            "'": "'",
-            "": ""
-        }
+        missing = [index for index, translation in enumerate(translations) if translation is None]
+        if missing:
+            logger.warning(f"{len(missing)} segmentos sin traducción en el lote, traduciendo individualmente")
+            fallbacks = self.translate_texts([texts[index] for index in missing], source_lang, target_lang)
+            for index, translation in zip(missing, fallbacks):
+                translations[index] = translation
         
-        context = " ".join([region.get('text', '') for region in text_regions if region.get('text')])
+        if context is not None:
+            context.add_lines(zip(cleaned, translations))
         
+        return translations
+    
+    def _prepare_regions(self, text_regions):
+        """Copia las regiones resolviendo los casos especiales; devuelve (regiones, índices pendientes)"""
         translated_regions = []
+        pending = []
         for i, region in enumerate(text_regions):
             region_copy = region.copy()
             text = region.get('text', '')
             
             if text:
-                if text in special_cases:
-                    region_copy['translated_text'] = special_cases[text]
-                    logger.info(f"Caso especial para '{text}': '{special_cases[text]}'")
+                if text in SPECIAL_CASES:
+                    region_copy['translated_text'] = SPECIAL_CASES[text]
+                    logger.info(f"Caso especial para '{text}': '{SPECIAL_CASES[text]}'")
                 else:
-                    try:
-                        if i > 0 and i < len(text_regions) - 1:
-                            prev_text = text_regions[i-1].get('translated_text', '')
-                            context_prompt = f"Contexto previo: {prev_text}\n\nTexto a traducir: {text}"
-                            translation_result = self.translate_text(context_prompt, source_lang, target_lang)
-                        else:
-                            translation_result = self.translate_text(text, source_lang, target_lang)
-                        
-                        region_copy['translated_text'] = translation_result.get('translated_text', '')
-                    except Exception as e:
-                        logger.error(f"Error al traducir región {i}: {str(e)}")
-                        region_copy['translated_text'] = text
+                    pending.append(i)
             else:
                 region_copy['translated_text'] = ''
             
             translated_regions.append(region_copy)
         
-        translated_regions = self.post_process_translations(translated_regions)
+        return translated_regions, pending
+    
+    def translate_pages(self, pages_regions, source_lang='auto', target_lang='es', context=None, on_progress=None):
+        """
+        Traduce las regiones de varias páginas consecutivas en las mismas peticiones por lotes
+        
+        Args:
+            pages_regions (list): Lista de listas de regiones, en orden de lectura
+            context (TranslationContext): Contexto del capítulo, compartido entre páginas
+            on_progress (callable): Recibe (textos traducidos, total) durante la traducción
+        
+        Returns:
+            list: Regiones traducidas de cada página, en el mismo orden
+        """
+        prepared = [self._prepare_regions(text_regions) for text_regions in pages_regions]
+        pending = [
+            (page_index, i)
+            for page_index, (_, page_pending) in enumerate(prepared)
+            for i in page_pending
+        ]
+        texts = [pages_regions[page_index][i]['text'] for page_index, i in pending]
+        
+        if not texts:
+            translations = []
+        elif self.batch_mode and (len(texts) > 1 or context is not None):
+            translations = self.translate_batch(texts, source_lang, target_lang, context, on_progress)
+        else:
+            translations = self.translate_texts(texts, source_lang, target_lang, on_progress)
+        
+        for (page_index, i), translation in zip(pending, translations):
+            prepared[page_index][0][i]['translated_text'] = translation
+        
+        results = []
+        for translated_regions, _ in prepared:
+            translated_regions = self.post_process_translations(translated_regions)
+            logger.info(f"Se procesaron {len(translated_regions)} regiones de texto")
+            results.append(translated_regions)
+        
+        return results
+    
+    def translate_manga_text(self, text_regions, source_lang='auto', target_lang='es', context=None, on_progress=None):
+        if not any(region.get('text') for region in text_regions):
+            logger.warning("No hay textos para traducir")
+            return text_regions
         
-        logger.info(f"Se procesaron {len(translated_regions)} regiones de texto")
-        return translated_regions
+        return self.translate_pages([text_regions], source_lang, target_lang, context, on_progress)[0]
         
     def post_process_translations(self, regions):
         for i in range(len(regions)):
@@ -1,53 +1,217 @@
 import os
+import json
+import hashlib
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import logging
 from pathlib import Path
-import tempfile
+from functools import lru_cache
+from django.conf import settings
+
+from .page_context import resolve_image
 
 logger = logging.getLogger(__name__)
 
+INPAINT_RADIUS = 10
+
+INPAINT_METHODS = {
+    'telea': cv2.INPAINT_TELEA,
+    'ns': cv2.INPAINT_NS,
+}
+
+# Contexto de medida compartido: evita crear una imagen y un ImageDraw por cada palabra medida
+_measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+@lru_cache(maxsize=128)
+def _load_truetype(font_path, size):
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=1)
+def _load_default_font():
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=50000)
+def measure_text_width(font, text):
+    """Ancho en píxeles de ``text``; las fuentes vienen de caché, así que su identidad es estable como clave"""
+    try:
+        bbox = _measure_draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0]
+    except Exception:
+        # Fallback aproximado
+        return len(text) * (getattr(font, 'size', 10) * 0.6)
+
+
 class ImageProcessor:
     def __init__(self):
         self.fonts = {}
         self._load_fonts()
     
-    def remove_original_text(self, image_path, text_regions):
-        try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"No se pudo leer la imagen en {image_path}")
-            
-            mask = np.zeros(image.shape[:2], dtype=np.uint8)
-            
-            for region in text_regions:
-                if 'bbox' in region:
-                    pts = []
-                    for point in region['bbox']:
-                        if isinstance(point, list) and len(point) == 2:
-                            pts.append([int(point[0]), int(point[1])])
-                    
-                    if pts:
-                        pts = np.array(pts, np.int32)
-                        pts = pts.reshape((-1, 1, 2))
-                        cv2.fillPoly(mask, [pts], 255)
+    def _build_text_mask(self, shape, text_regions):
+        mask = np.zeros(shape[:2], dtype=np.uint8)
+        
+        for region in text_regions:
+            if 'bbox' in region:
+                pts = []
+                for point in region['bbox']:
+                    if isinstance(point, list) and len(point) == 2:
+                        pts.append([int(point[0]), int(point[1])])
                 
-                elif 'bbox_simple' in region:
-                    bbox = region['bbox_simple']
-                    if len(bbox) == 4:
-                        x, y, w, h = [int(val) for val in bbox]
-                        padding = 5
-                        cv2.rectangle(mask, (x-padding, y-padding), (x + w + padding, y + h + padding), 255, -1)
+                if pts:
+                    pts = np.array(pts, np.int32)
+                    pts = pts.reshape((-1, 1, 2))
+                    cv2.fillPoly(mask, [pts], 255)
+            
+            elif 'bbox_simple' in region:
+                bbox = region['bbox_simple']
+                if len(bbox) == 4:
+                    x, y, w, h = [int(val) for val in bbox]
+                    padding = 5
+                    cv2.rectangle(mask, (x-padding, y-padding), (x + w + padding, y + h + padding), 255, -1)
+        
+        return mask
+    
+    def _mask_crops(self, mask, padding):
+        """Rectángulos (x0, y0, x1, y1) con margen alrededor de cada componente de la máscara, fusionando los solapados"""
+        height, width = mask.shape[:2]
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        
+        boxes = []
+        for label in range(1, count):
+            x, y, w, h = stats[label][:4]
+            boxes.append([
+                max(0, x - padding),
+                max(0, y - padding),
+                min(width, x + w + padding),
+                min(height, y + h + padding),
+            ])
+        
+        merged = True
+        while merged:
+            merged = False
+            result = []
+            for box in boxes:
+                for other in result:
+                    if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                        other[0] = min(other[0], box[0])
+                        other[1] = min(other[1], box[1])
+                        other[2] = max(other[2], box[2])
+                        other[3] = max(other[3], box[3])
+                        merged = True
+                        break
+                else:
+                    result.append(box)
+            boxes = result
+        
+        return boxes
+    
+    def _flat_fill(self, patch, patch_mask):
+        """Rellena la máscara con la mediana del color que la rodea (fondos lisos, p. ej. globos blancos)"""
+        ring = cv2.dilate(patch_mask, np.ones((7, 7), np.uint8)) & ~patch_mask
+        border_pixels = patch[ring > 0]
+        color = np.median(border_pixels, axis=0) if len(border_pixels) else np.array([255, 255, 255])
+        
+        filled = patch.copy()
+        filled[patch_mask > 0] = color.astype(patch.dtype)
+        return filled
+    
+    def _inpaint_patch(self, patch, patch_mask, method, radius):
+        if method == 'flat':
+            return self._flat_fill(patch, patch_mask)
+        
+        flags = INPAINT_METHODS.get(method, cv2.INPAINT_TELEA)
+        return cv2.inpaint(patch, patch_mask, radius, flags)
+    
+    def _region_rect(self, region):
+        if 'bbox_simple' in region and len(region['bbox_simple']) == 4:
+            return [int(val) for val in region['bbox_simple']]
+        
+        if region.get('bbox'):
+            x_coords = [int(p[0]) for p in region['bbox']]
+            y_coords = [int(p[1]) for p in region['bbox']]
+            return [min(x_coords), min(y_coords), max(x_coords) - min(x_coords), max(y_coords) - min(y_coords)]
+        
+        return None
+    
+    def _is_inside_bubble(self, region, bubble_contours):
+        rect = self._region_rect(region)
+        if rect is None:
+            return False
+        
+        x, y, w, h = rect
+        corners = [(x, y), (x + w, y), (x, y + h), (x + w, y + h)]
+        
+        for contour in bubble_contours:
+            if all(cv2.pointPolygonTest(contour, (float(cx), float(cy)), False) >= 0 for cx, cy in corners):
+                return True
+        
+        return False
+    
+    def _inpaint_mask_crops(self, image, result, mask, method, radius):
+        for x0, y0, x1, y1 in self._mask_crops(mask, padding=radius * 2):
+            patch_mask = mask[y0:y1, x0:x1]
+            patch = self._inpaint_patch(image[y0:y1, x0:x1], patch_mask, method, radius)
+            # Solo se copian los píxeles de la máscara: el margen del recorte puede
+            # incluir texto ya borrado por otra pasada que no debe volver
+            result[y0:y1, x0:x1][patch_mask > 0] = patch[patch_mask > 0]
+    
+    def remove_original_text(self, image_source, text_regions, method=None, return_stats=False):
+        """
+        Borra el texto inpintando solo recortes alrededor de cada zona de la máscara
+        
+        Las regiones contenidas en un globo blanco se rellenan con el color de
+        fondo (BUBBLE_FLAT_FILL); el resto usa el algoritmo de inpainting.
+        
+        Args:
+            method (str): 'telea', 'ns' o 'flat'; por defecto INPAINT_METHOD
+            return_stats (bool): devuelve también {'flat': n, 'inpaint': m} regiones por camino
+        """
+        image = None
+        stats = {'flat': 0, 'inpaint': 0}
+        try:
+            image, _ = resolve_image(image_source)
+            
+            method = method or getattr(settings, 'INPAINT_METHOD', 'telea')
+            inpaint_radius = INPAINT_RADIUS
+            
+            flat_regions = []
+            inpaint_regions = []
+            if method == 'flat':
+                flat_regions = list(text_regions)
+            elif getattr(settings, 'BUBBLE_FLAT_FILL', True):
+                bubble_contours = self._detect_white_bubble_contours(image)
+                for region in text_regions:
+                    if self._is_inside_bubble(region, bubble_contours):
+                        flat_regions.append(region)
+                    else:
+                        inpaint_regions.append(region)
+            else:
+                inpaint_regions = list(text_regions)
+            
+            image_without_text = image.copy()
             
-            inpaint_radius = 10
-            image_without_text = cv2.inpaint(image, mask, inpaint_radius, cv2.INPAINT_TELEA)
+            if flat_regions:
+                flat_mask = self._build_text_mask(image.shape, flat_regions)
+                self._inpaint_mask_crops(image, image_without_text, flat_mask, 'flat', inpaint_radius)
             
-            return image_without_text
+            if inpaint_regions:
+                inpaint_mask = self._build_text_mask(image.shape, inpaint_regions)
+                # Se parte de la imagen ya rellenada para no muestrear el texto de los globos
+                self._inpaint_mask_crops(image_without_text, image_without_text, inpaint_mask, method, inpaint_radius)
+            
+            stats = {'flat': len(flat_regions), 'inpaint': len(inpaint_regions)}
+            logger.info(f"Texto borrado: {stats['flat']} regiones con relleno liso, {stats['inpaint']} con inpainting")
             
         except Exception as e:
             logger.error(f"Error al eliminar texto original: {str(e)}")
-            return cv2.imread(image_path)
+            image_without_text = image.copy() if image is not None else None
+        
+        if return_stats:
+            return image_without_text, stats
+        return image_without_text
     
     def merge_close_regions(self, text_regions, distance_threshold=50):
         if not text_regions:
@@ -185,11 +349,11 @@ class ImageProcessor:
         
         if font_path and os.path.exists(font_path):
             try:
-                return ImageFont.truetype(font_path, size)
+                return _load_truetype(font_path, size)
             except Exception as e:
                 logger.error(f"Error al cargar fuente {font_path}: {str(e)}")
         
-        return ImageFont.load_default()
+        return _load_default_font()
     
     def add_translated_text(self, image, text_regions, target_language='es'):
         try:
@@ -222,103 +386,8 @@ class ImageProcessor:
                 result = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
                 return result
             
-            for region in valid_regions:
-                translated_text = region.get('translated_text', '')
-                
-                if 'bbox_simple' in region:
-                    x, y, width, height = [int(val) for val in region['bbox_simple']]
-                elif 'bbox' in region:
-                    points = region['bbox']
-                    x_coords = [int(p[0]) for p in points]
-                    y_coords = [int(p[1]) for p in points]
-                    x = min(x_coords)
-                    y = min(y_coords)
-                    width = max(x_coords) - x
-                    height = max(y_coords) - y
-                else:
-                    continue
-                
-                img_height, img_width = image.shape[:2]
-                x = max(0, min(x, img_width - 1))
-                y = max(0, min(y, img_height - 1))
-                width = min(width, img_width - x)
-                height = min(height, img_height - y)
-                
-                name_match = re.search(r'- ([A-Z][a-z]+ [A-Z][a-z]+)', translated_text)
-                name_text = ""
-                if name_match:
-                    name_text = name_match.group(0)
-                    translated_text = translated_text[:name_match.start()].strip()
-                
-                draw.rectangle([x, y, x+width, y+height], fill=(255, 255, 255), outline=(200, 200, 200))
-                
-                available_width = max(width - 10, 20)
-                available_height = max(height - 10, 20)
-                
-                base_font_size = max(min(height // 3, width // 10), 12)
-                font_size = base_font_size
-                
-                try:
-                    font = self.get_font(target_language, font_size)
-                except Exception as e:
-                    logger.error(f"Error al cargar fuente: {str(e)}")
-                    font = ImageFont.load_default()
-                
-                try:
-                    lines = self._wrap_text_smart(translated_text, available_width, font)
-                    
-                    total_text_height = len(lines) * (font_size + 2)
-                    if total_text_height > available_height and len(lines) > 1:
-                        scale_factor = available_height / total_text_height
-                        new_font_size = max(int(font_size * scale_factor), 10)
-                        font = self.get_font(target_language, new_font_size)
-                        font_size = new_font_size
-                        lines = self._wrap_text_smart(translated_text, available_width, font)
-                except Exception as e:
-                    logger.error(f"Error en wrapping de texto: {str(e)}")
-                    lines = [translated_text]
-                
-                line_height = font_size + 2
-                total_text_height = len(lines) * line_height
-                
-                text_y = y + (height - total_text_height) // 2
-                
-                for line in lines:
-                    try:
-                        text_bbox = draw.textbbox((0, 0), line, font=font)
-                        text_width = text_bbox[2] - text_bbox[0]
-                    except:
-                        try:
-                            text_width = font.getsize(line)[0]
-                        except:
-                            text_width = len(line) * (font_size // 2)
-                    
-                    text_x = x + (width - text_width) // 2
-                    
-                    draw.text((text_x+1, text_y+1), line, fill=(200, 200, 200), font=font)
-                    draw.text((text_x, text_y), line, fill=(0, 0, 0), font=font)
-                    text_y += line_height
-                
-                if name_text:
-                    try:
-                        name_font_size = max(font_size - 2, 10)
-                        name_font = self.get_font(target_language, name_font_size)
-                        
-                        try:
-                            name_bbox = draw.textbbox((0, 0), name_text, font=name_font)
-                            name_width = name_bbox[2] - name_bbox[0]
-                        except:
-                            try:
-                                name_width = name_font.getsize(name_text)[0]
-                            except:
-                                name_width = len(name_text) * (name_font_size // 2)
-                        
-                        name_x = x + width - name_width - 5
-                        name_y = y + height - name_font_size - 5
-                        
-                        draw.text((name_x, name_y), name_text, fill=(0, 0, 0), font=name_font)
-                    except Exception as e:
-                        logger.error(f"Error al añadir nombre: {str(e)}")
+            for layout in self.layout_regions(image.shape, valid_regions, target_language):
+                self.draw_text_layout(draw, layout)
             
             result = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
             return result
@@ -329,23 +398,156 @@ class ImageProcessor:
             logger.error(traceback.format_exc())
             return image
     
+    def _text_fits(self, text, size, language, available_width, available_height):
+        font = self.get_font(language, size)
+        lines = self._wrap_text_smart(text, available_width, font)
+        
+        fits = (
+            len(lines) * (size + 2) <= available_height
+            and all(measure_text_width(font, line) <= available_width for line in lines)
+        )
+        return fits, font, lines
+    
+    def fit_text_layout(self, text, box, language='es', min_size=10, max_size=120):
+        """
+        Busca por bisección el mayor tamaño de fuente con el que el texto ajustado cabe en la caja
+        
+        Args:
+            box (list): [x, y, ancho, alto] de la región en la imagen
+        
+        Returns:
+            dict: layout serializable a JSON (tamaño, líneas y posiciones) para draw_text_layout
+        """
+        x, y, width, height = box
+        available_width = max(width - 10, 20)
+        available_height = max(height - 10, 20)
+        
+        low = min_size
+        high = max(min_size, min(available_height - 2, max_size))
+        best_size = None
+        best_font = None
+        best_lines = None
+        
+        try:
+            while low <= high:
+                size = (low + high) // 2
+                fits, font, lines = self._text_fits(text, size, language, available_width, available_height)
+                if fits:
+                    best_size, best_font, best_lines = size, font, lines
+                    low = size + 1
+                else:
+                    high = size - 1
+            
+            if best_size is None:
+                best_size = min_size
+                best_font = self.get_font(language, best_size)
+                best_lines = self._wrap_text_smart(text, available_width, best_font)
+        except Exception as e:
+            logger.error(f"Error en wrapping de texto: {str(e)}")
+            best_size = min_size
+            best_font = self.get_font(language, best_size)
+            best_lines = [text]
+        
+        line_height = best_size + 2
+        text_y = y + (height - len(best_lines) * line_height) // 2
+        
+        lines = []
+        for line in best_lines:
+            text_width = measure_text_width(best_font, line)
+            lines.append({'text': line, 'x': int(x + (width - text_width) // 2), 'y': int(text_y)})
+            text_y += line_height
+        
+        return {
+            'box': [int(x), int(y), int(width), int(height)],
+            'language': language,
+            'font_size': best_size,
+            'line_height': line_height,
+            'lines': lines,
+            'name': None,
+        }
+    
+    def _layout_box(self, region):
+        """Caja [x, y, ancho, alto] en la que se coloca el texto: bbox_simple o, si no existe, el rectángulo de bbox"""
+        if 'bbox_simple' in region:
+            return [int(val) for val in region['bbox_simple']]
+        if region.get('bbox'):
+            points = region['bbox']
+            x_coords = [int(p[0]) for p in points]
+            y_coords = [int(p[1]) for p in points]
+            return [min(x_coords), min(y_coords), max(x_coords) - min(x_coords), max(y_coords) - min(y_coords)]
+        return None
+    
+    def layout_region(self, region, image_shape, target_language='es'):
+        """Calcula el layout de una región traducida, o None si no tiene coordenadas"""
+        translated_text = region.get('translated_text', '')
+        
+        box = self._layout_box(region)
+        if box is None:
+            return None
+        x, y, width, height = box
+        
+        img_height, img_width = image_shape[:2]
+        x = max(0, min(x, img_width - 1))
+        y = max(0, min(y, img_height - 1))
+        width = min(width, img_width - x)
+        height = min(height, img_height - y)
+        
+        name_match = re.search(r'- ([A-Z][a-z]+ [A-Z][a-z]+)', translated_text)
+        name_text = ""
+        if name_match:
+            name_text = name_match.group(0)
+            translated_text = translated_text[:name_match.start()].strip()
+        
+        layout = self.fit_text_layout(translated_text, [x, y, width, height], target_language)
+        
+        if name_text:
+            try:
+                name_font_size = max(layout['font_size'] - 2, 10)
+                name_font = self.get_font(target_language, name_font_size)
+                name_width = measure_text_width(name_font, name_text)
+                
+                layout['name'] = {
+                    'text': name_text,
+                    'font_size': name_font_size,
+                    'x': int(x + width - name_width - 5),
+                    'y': int(y + height - name_font_size - 5),
+                }
+            except Exception as e:
+                logger.error(f"Error al añadir nombre: {str(e)}")
+        
+        return layout
+    
+    def layout_regions(self, image_shape, text_regions, target_language='es'):
+        layouts = []
+        for region in text_regions:
+            if not region.get('translated_text', '').strip():
+                continue
+            layout = self.layout_region(region, image_shape, target_language)
+            if layout:
+                layouts.append(layout)
+        return layouts
+    
+    def draw_text_layout(self, draw, layout):
+        """Dibuja un layout ya calculado, sin volver a medir texto"""
+        x, y, width, height = layout['box']
+        draw.rectangle([x, y, x+width, y+height], fill=(255, 255, 255), outline=(200, 200, 200))
+        
+        font = self.get_font(layout['language'], layout['font_size'])
+        for line in layout['lines']:
+            draw.text((line['x']+1, line['y']+1), line['text'], fill=(200, 200, 200), font=font)
+            draw.text((line['x'], line['y']), line['text'], fill=(0, 0, 0), font=font)
+        
+        name = layout.get('name')
+        if name:
+            name_font = self.get_font(layout['language'], name['font_size'])
+            draw.text((name['x'], name['y']), name['text'], fill=(0, 0, 0), font=name_font)
+    
     def _wrap_text_smart(self, text, max_width, font):
         import re
         
         if not text:
             return []
         
-        # Intentar obtener medida de texto
-        def get_text_width(text, font):
-            try:
-                from PIL import ImageDraw
-                dummy_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
-                bbox = dummy_draw.textbbox((0, 0), text, font=font)
-                return bbox[2] - bbox[0]
-            except:
-                # Fallback aproximado
-                return len(text) * (font.size * 0.6)
-        
         # División básica por puntuación
         punctuation_breaks = re.split(r'([.!?:])', text)
         sentences = []
@@ -364,7 +566,7 @@ class ImageProcessor:
         # Procesar cada frase y hacer wrapping
         lines = []
         for sentence in sentences:
-            if get_text_width(sentence, font) <= max_width:
+            if measure_text_width(font, sentence) <= max_width:
                 lines.append(sentence)
                 continue
             
@@ -373,7 +575,7 @@ class ImageProcessor:
             current_width = 0
             
             for word in words:
-                word_width = get_text_width(word + ' ', font)
+                word_width = measure_text_width(font, word + ' ')
                 
                 if current_width + word_width <= max_width:
                     current_line.append(word)
@@ -392,31 +594,124 @@ class ImageProcessor:
         
         return lines
     
-    def process_manga_image(self, image_path, text_regions, target_language='es'):
+    def _validate_regions(self, text_regions):
+        valid_regions = []
+        for region in text_regions:
+            if not isinstance(region, dict):
+                logger.warning(f"Región no válida (no es dict): {type(region)}")
+                continue
+            
+            if 'bbox' not in region and 'bbox_simple' not in region:
+                logger.warning(f"Región sin coordenadas: {region.get('id')}")
+                continue
+            
+            if 'translated_text' not in region or not region['translated_text'].strip():
+                if 'text' in region and region['text'].strip():
+                    region['translated_text'] = region['text']
+                else:
+                    region['translated_text'] = "Texto de ejemplo"
+                
+            valid_regions.append(region)
+        
+        return valid_regions
+    
+    def _mask_geometry(self, region):
+        """Parte de la región que determina la máscara de borrado"""
+        if 'bbox' in region:
+            return {'bbox': region['bbox']}
+        return {'bbox_simple': region['bbox_simple']}
+    
+    def _geometry_key(self, geometry):
+        return json.dumps(geometry, sort_keys=True)
+    
+    def _layout_key(self, region, target_language):
+        # Se usa la misma caja que layout_region: el editor solo cambia bbox_simple al mover o redimensionar
+        key = json.dumps([self._layout_box(region), region.get('translated_text', ''), target_language], sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+    
+    def _rects_intersect(self, rect, window):
+        x, y, w, h = rect
+        x0, y0, x1, y1 = window
+        return x < x1 and x0 < x + w and y < y1 and y0 < y + h
+    
+    def refresh_clean_plate(self, image_source, plate, old_geometries, new_geometries):
+        """
+        Actualiza la imagen sin texto solo alrededor de las regiones añadidas, quitadas o movidas
+        
+        Returns:
+            ndarray: la misma ``plate`` si no cambió ninguna región, o una copia actualizada
+        """
+        old = {self._geometry_key(g): g for g in old_geometries}
+        new = {self._geometry_key(g): g for g in new_geometries}
+        changed = [g for key, g in old.items() if key not in new] + [g for key, g in new.items() if key not in old]
+        
+        if not changed:
+            return plate
+        
+        padding = INPAINT_RADIUS * 2
+        windows = self._mask_crops(self._build_text_mask(plate.shape, changed), padding)
+        
+        # Las regiones sin cambios que tocan las ventanas se vuelven a borrar completas para evitar costuras.
+        # Cada región añadida amplía las ventanas y puede tocar otras, así que se repite hasta que no entra ninguna
+        affected = {}
+        while True:
+            added = {
+                key: g for key, g in new.items()
+                if key not in affected
+                and self._region_rect(g) is not None
+                and any(self._rects_intersect(self._region_rect(g), window) for window in windows)
+            }
+            if not added:
+                break
+            affected.update(added)
+            windows = self._mask_crops(self._build_text_mask(plate.shape, changed + list(affected.values())), padding)
+        affected = list(affected.values())
+        
+        image, _ = resolve_image(image_source)
+        refreshed = self.remove_original_text(image, affected) if affected else image
+        
+        updated = plate.copy()
+        for x0, y0, x1, y1 in windows:
+            updated[y0:y1, x0:x1] = refreshed[y0:y1, x0:x1]
+        
+        logger.info(f"Imagen sin texto actualizada en {len(windows)} zonas ({len(changed)} regiones cambiadas)")
+        return updated
+    
+    def draw_layouts(self, image, layouts):
+        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(pil_image)
+        
+        for layout in layouts:
+            self.draw_text_layout(draw, layout)
+        
+        return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    
+    def render_with_plan(self, image_source, text_regions, target_language='es', plate=None, plan=None, on_stage=None):
+        """
+        Renderiza la página reutilizando, si se proporcionan, la imagen sin texto y el plan de un renderizado anterior
+        
+        Solo se vuelve a borrar el texto de las regiones cuya geometría cambió y
+        solo se recalcula el layout de las regiones cuyo texto o caja cambió.
+        
+        Args:
+            image_source: ruta, ndarray o PageContext; con un PageContext el original
+                solo se decodifica si hace falta volver a borrar texto
+            plate (ndarray): imagen sin texto del renderizado anterior
+            plan (dict): plan devuelto por el renderizado anterior
+            on_stage (callable): se llama con 'inpainted' al terminar el borrado del texto
+        
+        Returns:
+            tuple: (imagen final, imagen sin texto, plan)
+        """
         try:
             logger.info(f"Procesando imagen con {len(text_regions)} regiones de texto")
             
             if not text_regions:
-                text_regions = self._create_default_regions(image_path)
+                image, _ = resolve_image(image_source)
+                text_regions = self._create_default_regions(image)
                 logger.info(f"Creando regiones de texto por defecto: {len(text_regions)}")
             
-            valid_regions = []
-            for region in text_regions:
-                if not isinstance(region, dict):
-                    logger.warning(f"Región no válida (no es dict): {type(region)}")
-                    continue
-                
-                if 'bbox' not in region and 'bbox_simple' not in region:
-                    logger.warning(f"Región sin coordenadas: {region.get('id')}")
-                    continue
-                
-                if 'translated_text' not in region or not region['translated_text'].strip():
-                    if 'text' in region and region['text'].strip():
-                        region['translated_text'] = region['text']
-                    else:
-                        region['translated_text'] = "Texto de ejemplo"
-                    
-                valid_regions.append(region)
+            valid_regions = self._validate_regions(text_regions)
             
             if not valid_regions:
                 raise ValueError("No hay regiones válidas para procesar la imagen")
@@ -424,20 +719,57 @@ class ImageProcessor:
             merged_regions = self.merge_close_regions(valid_regions)
             logger.info(f"Regiones combinadas: {len(valid_regions)} → {len(merged_regions)}")
             
-            image_no_text = self.remove_original_text(image_path, valid_regions)
+            geometries = [self._mask_geometry(region) for region in valid_regions]
+            
+            if plate is not None and plan and plan.get('mask_regions') is not None:
+                image_no_text = self.refresh_clean_plate(image_source, plate, plan['mask_regions'], geometries)
+            else:
+                image, image_path = resolve_image(image_source)
+                image_no_text = self.remove_original_text(image, valid_regions)
+                
+                if image_path and getattr(settings, 'SAVE_DEBUG_IMAGES', False):
+                    debug_dir = os.path.dirname(os.path.dirname(image_path)) + '/results'
+                    os.makedirs(debug_dir, exist_ok=True)
+                    debug_path = os.path.join(debug_dir, 'debug_no_text.jpg')
+                    cv2.imwrite(debug_path, image_no_text)
+            
+            if on_stage:
+                on_stage('inpainted')
+            
+            previous_layouts = {}
+            if plan and plan.get('target_language') == target_language:
+                previous_layouts = {entry['key']: entry['layout'] for entry in plan.get('layouts', [])}
+            
+            layouts = []
+            reused = 0
+            for region in merged_regions:
+                if not region.get('translated_text', '').strip():
+                    continue
+                
+                key = self._layout_key(region, target_language)
+                layout = previous_layouts.get(key)
+                if layout:
+                    reused += 1
+                else:
+                    layout = self.layout_region(region, image_no_text.shape, target_language)
+                
+                if layout:
+                    layouts.append({'key': key, 'layout': layout})
             
-            debug_dir = os.path.dirname(os.path.dirname(image_path)) + '/results'
-            os.makedirs(debug_dir, exist_ok=True)
-            debug_path = os.path.join(debug_dir, 'debug_no_text.jpg')
-            cv2.imwrite(debug_path, image_no_text)
+            logger.info(f"Layouts reutilizados: {reused}/{len(layouts)}")
             
-            final_image = self.add_translated_text(image_no_text, merged_regions, target_language)
+            if layouts:
+                final_image = self.draw_layouts(image_no_text, [entry['layout'] for entry in layouts])
+            else:
+                final_image = self.add_translated_text(image_no_text, merged_regions, target_language)
             
-            output_path = self._get_output_path(image_path)
-            cv2.imwrite(output_path, final_image)
-            logger.info(f"Imagen final guardada en: {output_path}")
+            new_plan = {
+                'target_language': target_language,
+                'mask_regions': geometries,
+                'layouts': layouts,
+            }
             
-            return output_path
+            return final_image, image_no_text, new_plan
             
         except Exception as e:
             logger.error(f"Error al procesar imagen de manga: {str(e)}")
@@ -445,9 +777,40 @@ class ImageProcessor:
             logger.error(traceback.format_exc())
             raise
     
-    def _create_default_regions(self, image_path):
+    def render_translated_image(self, image_source, text_regions, target_language='es'):
+        """
+        Borra el texto original y dibuja las traducciones, sin escribir nada en disco
+        
+        Args:
+            image_source: ruta de la imagen, ndarray BGR o PageContext (se decodifica una sola vez)
+        
+        Returns:
+            ndarray: imagen final en BGR
+        """
+        final_image, _, _ = self.render_with_plan(image_source, text_regions, target_language)
+        return final_image
+    
+    def decode_image(self, content):
+        """Decodifica bytes de imagen (p. ej. leídos del storage) a ndarray BGR"""
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        return image
+    
+    def encode_image(self, image, ext='.jpg'):
+        """Codifica una imagen BGR en memoria con el formato de la extensión dada"""
+        ext = ext.lower() if ext else '.jpg'
+        if ext not in ('.jpg', '.jpeg', '.png', '.webp'):
+            ext = '.jpg'
+        
+        success, buffer = cv2.imencode(ext, image)
+        if not success:
+            raise ValueError(f"No se pudo codificar la imagen como {ext}")
+        
+        return buffer.tobytes()
+    
+    def _create_default_regions(self, image):
         try:
-            image = cv2.imread(image_path)
             height, width = image.shape[:2]
             
             default_regions = []
@@ -476,7 +839,7 @@ class ImageProcessor:
                 'translated_text': 'Texto de ejemplo'
             }]
     
-    def _detect_white_bubbles(self, image):
+    def _detect_white_bubble_contours(self, image):
         try:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             _, binary = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
@@ -489,21 +852,14 @@ class ImageProcessor:
                 if area > 1000 and area < 100000:
                     x, y, w, h = cv2.boundingRect(contour)
                     if w > 50 and h > 20 and w < image.shape[1] * 0.8 and h < image.shape[0] * 0.8:
-                        bubbles.append([x, y, w, h])
+                        bubbles.append(contour)
             
             return bubbles
         except Exception as e:
             logger.error(f"Error al detectar burbujas: {str(e)}")
             return []
     
-    def _get_output_path(self, original_path):
-        dir_name = os.path.dirname(original_path)
-        file_name = os.path.basename(original_path)
-        name, ext = os.path.splitext(file_name)
-        
-        results_dir = os.path.join(os.path.dirname(dir_name), 'results')
-        os.makedirs(results_dir, exist_ok=True)
-        
-        return os.path.join(results_dir, f"{name}_translated{ext}")
-        
+    def _detect_white_bubbles(self, image):
+        return [list(cv2.boundingRect(contour)) for contour in self._detect_white_bubble_contours(image)]
+    
 import re  # Añadir import de re que faltaba
\ No newline at end of file
@@ -0,0 +1,223 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Chapter, MangaPage, TranslationJob
+from . import progress
+from .llm_clients import get_metrics
+from .ocr_service import get_ocr_stats
+from .page_dedup import reuse_existing_translation
+
+logger = logging.getLogger(__name__)
+
+
+def _lease_duration():
+    return timedelta(seconds=getattr(settings, 'TRANSLATION_JOB_LEASE_SECONDS', 900))
+
+
+def _claimable(now):
+    """Trabajos en cola o cuya concesión expiró y aún tienen intentos disponibles"""
+    return Q(status='queued') | Q(
+        status='running',
+        lease_expires_at__lt=now,
+        attempts__lt=F('max_attempts'),
+    )
+
+
+def enqueue_translation(manga_page):
+    """
+    Encola el procesamiento de una página y la deja en estado 'pending'
+    
+    Returns:
+        TranslationJob | None: None si la página se completó reutilizando una traducción idéntica
+    """
+    if reuse_existing_translation(manga_page):
+        return None
+    
+    with transaction.atomic():
+        if manga_page.status != 'pending':
+            manga_page.status = 'pending'
+            manga_page.save(update_fields=['status', 'updated_at'])
+        
+        job = TranslationJob.objects.create(
+            manga_page=manga_page,
+            max_attempts=getattr(settings, 'TRANSLATION_JOB_MAX_ATTEMPTS', 2),
+        )
+    
+    logger.info(f"Página {manga_page.id} encolada en el trabajo {job.id}")
+    return job
+
+
+def enqueue_chapter(chapter):
+    """Encola un capítulo completo; sus páginas se procesan con el pipeline por etapas"""
+    with transaction.atomic():
+        chapter.status = 'pending'
+        chapter.save(update_fields=['status', 'updated_at'])
+        
+        job = TranslationJob.objects.create(
+            chapter=chapter,
+            max_attempts=getattr(settings, 'TRANSLATION_JOB_MAX_ATTEMPTS', 2),
+        )
+    
+    logger.info(f"Capítulo {chapter.id} encolado en el trabajo {job.id}")
+    return job
+
+
+def _expire_exhausted_jobs(now):
+    """Marca como fallidos los trabajos abandonados que ya agotaron sus intentos"""
+    stale = TranslationJob.objects.filter(
+        status='running',
+        lease_expires_at__lt=now,
+        attempts__gte=F('max_attempts'),
+    )
+    expired = list(stale.values_list('manga_page_id', 'chapter_id'))
+    
+    if expired:
+        page_ids = [page_id for page_id, _ in expired if page_id]
+        chapter_ids = [chapter_id for _, chapter_id in expired if chapter_id]
+        
+        stale.update(status='failed', last_error='Concesión expirada sin respuesta del worker', updated_at=now)
+        MangaPage.objects.filter(id__in=page_ids).update(status='failed', updated_at=now)
+        MangaPage.objects.filter(chapter_id__in=chapter_ids).exclude(status='completed').update(status='failed', updated_at=now)
+        Chapter.objects.filter(id__in=chapter_ids).update(status='failed', updated_at=now)
+        logger.warning(f"Trabajos expirados marcados como fallidos (páginas {page_ids}, capítulos {chapter_ids})")
+
+
+def claim_next_job(worker_id, batch=10):
+    """
+    Reclama el siguiente trabajo disponible para un worker
+    
+    El reclamo es un UPDATE condicional sobre la fila del trabajo, de modo que
+    dos workers que compiten por el mismo trabajo no pueden obtenerlo ambos.
+    
+    Returns:
+        TranslationJob | None: trabajo reclamado con su concesión activa
+    """
+    now = timezone.now()
+    _expire_exhausted_jobs(now)
+    
+    candidate_ids = list(
+        TranslationJob.objects.filter(_claimable(now))
+        .order_by('created_at')
+        .values_list('id', flat=True)[:batch]
+    )
+    
+    for job_id in candidate_ids:
+        claimed = TranslationJob.objects.filter(_claimable(now), id=job_id).update(
+            status='running',
+            worker_id=worker_id,
+            lease_expires_at=now + _lease_duration(),
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        
+        if claimed:
+            job = TranslationJob.objects.get(id=job_id)
+            if job.manga_page_id:
+                MangaPage.objects.filter(id=job.manga_page_id).update(status='processing', updated_at=now)
+            else:
+                Chapter.objects.filter(id=job.chapter_id).update(status='processing', updated_at=now)
+            logger.info(f"Worker {worker_id} reclamó el trabajo {job.id} (intento {job.attempts})")
+            return job
+    
+    return None
+
+
+def renew_lease(job):
+    """Prolonga la concesión de un trabajo largo (p. ej. tras cada página de un capítulo)"""
+    TranslationJob.objects.filter(id=job.id, worker_id=job.worker_id, status='running').update(
+        lease_expires_at=timezone.now() + _lease_duration(),
+    )
+
+
+def complete_job(job):
+    TranslationJob.objects.filter(id=job.id, worker_id=job.worker_id).update(
+        status='done',
+        lease_expires_at=None,
+        last_error='',
+        updated_at=timezone.now(),
+    )
+
+
+def fail_job(job, error):
+    """Reencola el trabajo si quedan intentos; si no, lo marca como fallido"""
+    now = timezone.now()
+    retry = job.attempts < job.max_attempts
+    
+    TranslationJob.objects.filter(id=job.id, worker_id=job.worker_id).update(
+        status='queued' if retry else 'failed',
+        lease_expires_at=None,
+        last_error=str(error),
+        updated_at=now,
+    )
+    if job.manga_page_id:
+        page_ids = [job.manga_page_id]
+        MangaPage.objects.filter(id=job.manga_page_id).update(status='pending' if retry else 'failed', updated_at=now)
+    else:
+        # Las páginas sin completar vuelven a procesarse en el siguiente intento del capítulo
+        unfinished = MangaPage.objects.filter(chapter_id=job.chapter_id).exclude(status='completed')
+        page_ids = list(unfinished.values_list('id', flat=True))
+        Chapter.objects.filter(id=job.chapter_id).update(status='pending' if retry else 'failed', updated_at=now)
+        unfinished.update(status='pending' if retry else 'failed', updated_at=now)
+    
+    for page_id in page_ids:
+        if retry:
+            # Se descartan los eventos del intento fallido para que no se reproduzca un 'failed' antiguo
+            progress.reset(page_id)
+            progress.emit(page_id, 'retrying', error=str(error))
+        else:
+            progress.emit(page_id, 'failed', error=str(error))
+    
+    if retry:
+        logger.warning(f"Trabajo {job.id} reencolado tras error: {error}")
+    else:
+        logger.error(f"Trabajo {job.id} fallido definitivamente: {error}")
+
+
+def run_worker(worker_id, poll_interval=None, exit_when_idle=False, stop_event=None):
+    """
+    Bucle principal de un worker: reclama trabajos y ejecuta el pipeline de traducción
+    
+    Args:
+        worker_id (str): identificador del worker, guardado en el trabajo reclamado
+        poll_interval (float): segundos de espera cuando la cola está vacía
+        exit_when_idle (bool): termina en cuanto la cola queda vacía
+        stop_event: evento opcional para detener el bucle
+    """
+    from .chapter_pipeline import process_chapter
+    from .translation_pipeline import process_manga_translation
+    
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'TRANSLATION_WORKER_POLL_INTERVAL', 2)
+    
+    processed = 0
+    logger.info(f"Worker {worker_id} iniciado")
+    
+    while stop_event is None or not stop_event.is_set():
+        job = claim_next_job(worker_id)
+        
+        if job is None:
+            if exit_when_idle:
+                break
+            time.sleep(poll_interval)
+            continue
+        
+        try:
+            if job.chapter_id:
+                process_chapter(job.chapter_id, on_page_done=lambda manga_page: renew_lease(job))
+            else:
+                process_manga_translation(job.manga_page_id)
+            complete_job(job)
+        except Exception as e:
+            fail_job(job, e)
+        
+        processed += 1
+    
+    logger.info(f"Worker {worker_id} detenido tras {processed} trabajos")
+    logger.info(f"Conexiones LLM del worker {worker_id}: {get_metrics()}")
+    logger.info(f"Etapas de OCR del worker {worker_id}: {get_ocr_stats()}")
+    return processed
@@ -0,0 +1,141 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import weakref
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_settings():
+    """Configuración del pool HTTP, leída del entorno como el resto de opciones del LLM"""
+    pool_size = int(os.environ.get("LLM_POOL_SIZE", 10))
+    return {
+        'limits': httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60)),
+        ),
+        'timeout': httpx.Timeout(
+            float(os.environ.get("LLM_READ_TIMEOUT", 60)),
+            connect=float(os.environ.get("LLM_CONNECT_TIMEOUT", 5)),
+        ),
+        # HTTP/2 solo si está instalado el paquete h2 (httpx[http2])
+        'http2': (
+            os.environ.get("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+            and importlib.util.find_spec('h2') is not None
+        ),
+    }
+
+
+def _max_retries():
+    # El SDK reintenta con espera exponencial los errores de conexión, 408, 429 y 5xx
+    return int(os.environ.get("LLM_MAX_RETRIES", 3))
+
+
+class ConnectionMetrics:
+    """Cuenta cuántas respuestas llegaron por una conexión nueva y cuántas reutilizaron una abierta"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.http_versions = {}
+        self._seen = weakref.WeakSet()
+
+    def record(self, response):
+        stream = response.extensions.get('network_stream')
+        http_version = response.extensions.get('http_version', b'').decode() or 'unknown'
+        
+        with self.lock:
+            self.requests += 1
+            self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+            
+            try:
+                if stream is not None and stream in self._seen:
+                    return
+                if stream is not None:
+                    self._seen.add(stream)
+            except TypeError:
+                pass
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self.lock:
+            reused = self.requests - self.new_connections
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': reused,
+                'reuse_rate': reused / self.requests if self.requests else 0.0,
+                'http_versions': dict(self.http_versions),
+            }
+
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _metrics_for(base_url):
+    metrics = _metrics.get(base_url or 'default')
+    if metrics is None:
+        metrics = ConnectionMetrics()
+        _metrics[base_url or 'default'] = metrics
+    return metrics
+
+
+def get_client(api_key, base_url):
+    """
+    Cliente OpenAI del proceso para un proveedor, con pool de conexiones keep-alive
+    
+    Se crea una sola vez por (api_key, base_url) y se comparte entre hilos, de
+    modo que las peticiones reutilizan las conexiones TLS ya abiertas.
+    """
+    key = (api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            metrics = _metrics_for(base_url)
+            pool_settings = _pool_settings()
+            http_client = httpx.Client(event_hooks={'response': [metrics.record]}, **pool_settings)
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=_max_retries())
+            _clients[key] = client
+            logger.info(f"Cliente OpenAI creado para {base_url} (HTTP/2: {pool_settings['http2']})")
+        return client
+
+
+def get_async_client(api_key, base_url):
+    """
+    Cliente AsyncOpenAI del bucle de eventos actual para un proveedor
+    
+    El pool de un cliente asíncrono queda ligado al bucle que lo usa, por eso
+    se guarda uno por bucle; las métricas se comparten con el cliente síncrono.
+    """
+    loop = asyncio.get_running_loop()
+    key = (api_key, base_url)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            metrics = _metrics_for(base_url)
+            
+            async def record(response):
+                metrics.record(response)
+            
+            http_client = httpx.AsyncClient(event_hooks={'response': [record]}, **_pool_settings())
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=_max_retries())
+            clients[key] = client
+            logger.info(f"Cliente AsyncOpenAI creado para {base_url}")
+        return client
+
+
+def get_metrics():
+    """Métricas de reutilización de conexiones por proveedor"""
+    with _lock:
+        metrics = dict(_metrics)
+    return {base_url: provider_metrics.snapshot() for base_url, provider_metrics in metrics.items()}
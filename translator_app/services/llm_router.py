@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .llm_clients import get_async_client, get_client
+from .rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class ProviderStats:
+    """Latencias y errores recientes de un proveedor (ventana de LLM_STATS_WINDOW_SECONDS)"""
+
+    def __init__(self, window_seconds=None, max_samples=500):
+        self.window_seconds = window_seconds or _env_float("LLM_STATS_WINDOW_SECONDS", 300)
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self.lock:
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            return list(self.samples)
+
+    def snapshot(self):
+        samples = self._recent()
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+        
+        return {
+            'samples': len(samples),
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'error_rate': errors / len(samples) if samples else 0.0,
+        }
+
+
+class Provider:
+    """Un backend compatible con la API de OpenAI (URL base, clave y modelo)"""
+
+    def __init__(self, name, base_url, api_key, model, rate_limit_rps=None, rate_limit_burst=None):
+        """
+        Args:
+            rate_limit_rps (float): peticiones por segundo de este proveedor; por defecto TRANSLATION_RATE_LIMIT_RPS
+            rate_limit_burst (int): ráfaga máxima; por defecto TRANSLATION_RATE_LIMIT_BURST
+        """
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.stats = ProviderStats()
+        if rate_limit_rps is None:
+            rate_limit_rps = os.environ.get("TRANSLATION_RATE_LIMIT_RPS", 0)
+        if rate_limit_burst is None:
+            rate_limit_burst = os.environ.get("TRANSLATION_RATE_LIMIT_BURST", 0)
+        # Un limitador por entrada, para que cada proveedor respete su propio límite
+        self.rate_limiter = get_rate_limiter(
+            (name, base_url or 'default'),
+            float(rate_limit_rps),
+            int(rate_limit_burst) or None,
+        )
+
+
+def load_providers():
+    """
+    Lee los proveedores de LLM_PROVIDERS (lista JSON) o, si no existe, de OPENROUTER_BASE_URL/DEFAULT_MODEL
+    
+    Ejemplo: [{"name": "openrouter", "base_url": "https://openrouter.ai/api/v1",
+    "api_key_env": "OPENROUTER_API_KEY", "model": "anthropic/claude-3-haiku",
+    "rate_limit_rps": 2, "rate_limit_burst": 4}, ...]
+    
+    rate_limit_rps y rate_limit_burst son opcionales; sin ellos se usan
+    TRANSLATION_RATE_LIMIT_RPS y TRANSLATION_RATE_LIMIT_BURST.
+    """
+    default_model = os.environ.get("DEFAULT_MODEL", "anthropic/claude-3-haiku")
+    raw = os.environ.get("LLM_PROVIDERS")
+    
+    if not raw:
+        return [Provider('default', os.environ.get("OPENROUTER_BASE_URL"), os.environ.get("OPENROUTER_API_KEY"), default_model)]
+    
+    providers = []
+    for index, entry in enumerate(json.loads(raw)):
+        api_key = entry.get('api_key') or os.environ.get(entry.get('api_key_env', ''), '')
+        providers.append(Provider(
+            entry.get('name') or f"provider-{index}",
+            entry.get('base_url'),
+            api_key,
+            entry.get('model') or default_model,
+            rate_limit_rps=entry.get('rate_limit_rps'),
+            rate_limit_burst=entry.get('rate_limit_burst'),
+        ))
+    return providers
+
+
+class LLMRouter:
+    """
+    Reparte las peticiones de chat entre varios proveedores según su latencia y tasa de error
+    
+    Se elige el proveedor sano con menor p50 reciente. Si la cobertura está
+    activada y la petición supera el p95 del proveedor elegido, se lanza una
+    copia al segundo mejor y se usa la primera respuesta válida. Si un
+    proveedor falla se prueba el siguiente.
+    """
+
+    def __init__(self, providers):
+        self.providers = providers
+        self.hedging = os.environ.get("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+        self.hedge_min_samples = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+        self.hedge_min_delay = _env_float("LLM_HEDGE_MIN_DELAY", 0.5)
+        self.max_error_rate = _env_float("LLM_MAX_ERROR_RATE", 0.5)
+        self.min_health_samples = int(os.environ.get("LLM_MIN_HEALTH_SAMPLES", 5))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("LLM_ROUTER_WORKERS", 16)),
+            thread_name_prefix='llm-router',
+        )
+
+    def ranked(self):
+        """Proveedores ordenados: primero los sanos, y entre ellos los de menor p50"""
+        def sort_key(provider):
+            stats = provider.stats.snapshot()
+            unhealthy = stats['samples'] >= self.min_health_samples and stats['error_rate'] > self.max_error_rate
+            # Sin muestras recientes cuenta como rápido, para volver a probarlo
+            return (unhealthy, stats['p50'] or 0.0, stats['error_rate'])
+        
+        return sorted(self.providers, key=sort_key)
+
+    def _hedge_delay(self, provider):
+        stats = provider.stats.snapshot()
+        if stats['samples'] < self.hedge_min_samples or stats['p95'] is None:
+            return None
+        return max(self.hedge_min_delay, stats['p95'])
+
+    def _call(self, provider, request):
+        provider.rate_limiter.acquire()
+        client = get_client(provider.api_key, provider.base_url)
+        started = time.monotonic()
+        try:
+            response = client.chat.completions.create(model=provider.model, **request)
+        except Exception:
+            provider.stats.record(time.monotonic() - started, False)
+            raise
+        provider.stats.record(time.monotonic() - started, True)
+        return response
+    
+    async def _acall(self, provider, request):
+        await provider.rate_limiter.acquire_async()
+        client = get_async_client(provider.api_key, provider.base_url)
+        started = time.monotonic()
+        try:
+            response = await client.chat.completions.create(model=provider.model, **request)
+        except Exception:
+            provider.stats.record(time.monotonic() - started, False)
+            raise
+        provider.stats.record(time.monotonic() - started, True)
+        return response
+
+    def _plan(self):
+        candidates = self.ranked()
+        if not candidates:
+            raise RuntimeError("No hay proveedores de LLM configurados")
+        
+        hedge_delay = None
+        if self.hedging and len(candidates) > 1:
+            hedge_delay = self._hedge_delay(candidates[0])
+        return candidates, hedge_delay
+
+    def chat(self, **request):
+        """Equivale a chat.completions.create(**request) en el proveedor elegido"""
+        return self.route(**request)[0]
+    
+    def route(self, **request):
+        """
+        Como chat, pero devuelve también el proveedor que respondió
+        
+        Sin cobertura la petición se hace en el propio hilo; con ella, ambas
+        copias corren en el pool del router y se devuelve la primera válida.
+        
+        Returns:
+            tuple: (respuesta, Provider)
+        """
+        candidates, hedge_delay = self._plan()
+        futures = {}
+        error = None
+        
+        if hedge_delay is not None:
+            futures[self.executor.submit(self._call, candidates[0], request)] = candidates[0]
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                logger.info(f"{candidates[0].name} supera su p95 ({hedge_delay:.2f}s); petición de cobertura a {candidates[1].name}")
+                futures[self.executor.submit(self._call, candidates[1], request)] = candidates[1]
+        
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    # La petición perdedora termina en segundo plano y solo aporta estadísticas
+                    return future.result(), futures[future]
+                except Exception as e:
+                    logger.warning(f"Fallo en el proveedor {futures[future].name}: {str(e)}")
+                    error = e
+        
+        for provider in candidates[len(futures):]:
+            try:
+                return self._call(provider, request), provider
+            except Exception as e:
+                logger.warning(f"Fallo en el proveedor {provider.name}: {str(e)}")
+                error = e
+        raise error
+    
+    async def achat(self, **request):
+        """Versión asíncrona de chat"""
+        return (await self.aroute(**request))[0]
+    
+    async def aroute(self, **request):
+        """Versión asíncrona de route; la petición perdedora de una cobertura se cancela"""
+        candidates, hedge_delay = self._plan()
+        tasks = {}
+        error = None
+        
+        if hedge_delay is not None:
+            tasks[asyncio.ensure_future(self._acall(candidates[0], request))] = candidates[0]
+            done, _ = await asyncio.wait(set(tasks), timeout=hedge_delay)
+            if not done:
+                logger.info(f"{candidates[0].name} supera su p95 ({hedge_delay:.2f}s); petición de cobertura a {candidates[1].name}")
+                tasks[asyncio.ensure_future(self._acall(candidates[1], request))] = candidates[1]
+        
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result(), tasks[task]
+                logger.warning(f"Fallo en el proveedor {tasks[task].name}: {str(task.exception())}")
+                error = task.exception()
+        
+        for provider in candidates[len(tasks):]:
+            try:
+                return await self._acall(provider, request), provider
+            except Exception as e:
+                logger.warning(f"Fallo en el proveedor {provider.name}: {str(e)}")
+                error = e
+        raise error
+
+    def models(self):
+        """Modelos de los proveedores configurados, sin repetir y en orden"""
+        return list(dict.fromkeys(provider.model for provider in self.providers))
+    
+    def get_stats(self):
+        return {provider.name: {'model': provider.model, **provider.stats.snapshot()} for provider in self.providers}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Router del proceso, creado la primera vez a partir del entorno"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter(load_providers())
+            logger.info(f"Router LLM con proveedores: {[provider.name for provider in _router.providers]}")
+        return _router
@@ -0,0 +1,154 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+from django.conf import settings
+
+from .ocr_service import OCRService, warm_up_readers
+from .page_context import resolve_image
+
+logger = logging.getLogger(__name__)
+
+
+# --- Código que se ejecuta en los procesos del pool ---
+
+_worker_service = None
+
+
+def _init_worker(languages):
+    """Carga en cada proceso su propio lector, para que el primer trabajo no pague la carga del modelo"""
+    global _worker_service
+    _worker_service = OCRService()
+    warm_up_readers(languages)
+
+
+def _run_on_shared_image(handle, func):
+    """Ejecuta ``func`` sobre una vista ndarray (sin copia) de la memoria compartida creada por el proceso padre"""
+    name, shape, dtype = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        try:
+            return func(image)
+        finally:
+            # La vista debe liberarse antes de cerrar el segmento
+            del image
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # Aún hay referencias (p. ej. en una traza de error); se cierra al recolectarlas
+            pass
+
+
+def _detect_task(handle, language):
+    return _run_on_shared_image(handle, lambda image: _worker_service.detect_text_regions(image, language))
+
+
+def _read_tile(image, language, top, bottom):
+    reader = _worker_service.get_reader(language)
+    results = _worker_service._readtext(reader, image[top:bottom])
+    # Tipos nativos para devolver el resultado por pickle
+    return [
+        ([[int(x), int(y)] for x, y in bbox], str(text), float(prob))
+        for bbox, text, prob in results
+    ]
+
+
+def _readtext_task(handle, language, top, bottom):
+    return _run_on_shared_image(handle, lambda image: _read_tile(image, language, top, bottom))
+
+
+# --- Lado del proceso padre ---
+
+@contextmanager
+def shared_image(image):
+    """Copia la imagen una vez a memoria compartida y la libera al salir; devuelve su descriptor"""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+    try:
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+        yield (shm.name, image.shape, image.dtype.str)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class OCRPool:
+    """
+    Pool de procesos de OCR, cada uno con su propio lector EasyOCR ya cargado
+    
+    EasyOCR en CPU está limitado por el GIL dentro de un proceso; con varios
+    procesos un equipo con muchos núcleos procesa varias páginas (o franjas de
+    una tira) a la vez. Las imágenes decodificadas se pasan por
+    multiprocessing.shared_memory en lugar de serializarlas con pickle, y los
+    resultados vuelven como las regiones habituales.
+    """
+
+    def __init__(self, processes, languages=None, start_method=None):
+        self.processes = processes
+        languages = languages if languages is not None else getattr(settings, 'OCR_WARMUP_LANGUAGES', [])
+        context = multiprocessing.get_context(start_method or getattr(settings, 'OCR_POOL_START_METHOD', 'spawn'))
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(list(languages),),
+        )
+
+    def detect_text_regions(self, image_source, language='auto'):
+        """Igual que OCRService.detect_text_regions, pero en un proceso del pool"""
+        image, _ = resolve_image(image_source)
+        with shared_image(image) as handle:
+            return self.executor.submit(_detect_task, handle, language).result()
+
+    def read_tiles(self, image, language, ranges):
+        """
+        OCR en paralelo de varias franjas (top, bottom) de la misma imagen
+        
+        Returns:
+            list: resultados de readtext por franja, con coordenadas de la franja
+        """
+        with shared_image(image) as handle:
+            futures = [
+                self.executor.submit(_readtext_task, handle, language, top, bottom)
+                for top, bottom in ranges
+            ]
+            return [future.result() for future in futures]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_processes_override = None
+
+
+def configure_pool(processes):
+    """
+    Fija el tamaño del pool de este proceso en lugar de OCR_POOL_PROCESSES
+    
+    run_translation_worker lo usa para repartir OCR_POOL_PROCESSES entre sus
+    workers: cada worker tiene su propio pool y cada proceso del pool carga
+    sus propios modelos, así que sin repartir la memoria se multiplicaría
+    por el número de workers.
+    """
+    global _processes_override
+    _processes_override = processes
+
+
+def get_ocr_pool():
+    """Pool del proceso según OCR_POOL_PROCESSES (o configure_pool); None si está desactivado (0)"""
+    global _pool
+    processes = _processes_override if _processes_override is not None else getattr(settings, 'OCR_POOL_PROCESSES', 0)
+    if processes <= 0:
+        return None
+    
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRPool(processes)
+            logger.info(f"Pool de OCR iniciado con {processes} procesos")
+        return _pool
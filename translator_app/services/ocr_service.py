@@ -1,40 +1,214 @@
-import os
 import easyocr
 import cv2
 import numpy as np
 import logging
 import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from django.conf import settings
 
+from .page_context import resolve_image
+
 logger = logging.getLogger(__name__)
 
-class OCRService:
-    def __init__(self):
-        self.readers = {}
+LANGUAGE_MAP = {
+    'ja': ['ja', 'en'],
+    'ko': ['ko', 'en'],
+    'zh': ['ch_sim', 'en'],
+    'auto': ['ko', 'en'],
+}
+
+DEFAULT_LANG_LIST = ['en', 'ko']
+
+# Rangos Unicode por escritura para clasificar el texto de la pasada de sondeo
+SCRIPT_RANGES = {
+    'hangul': [(0xAC00, 0xD7A3), (0x1100, 0x11FF), (0x3130, 0x318F)],
+    'kana': [(0x3040, 0x30FF), (0x31F0, 0x31FF), (0xFF66, 0xFF9F)],
+    'han': [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)],
+}
+
+# Lectores del sondeo de idioma, en orden, con los resultados que cada uno puede respaldar.
+# El japonés emite kana y kanji, así que distingue japonés de chino; el coreano solo se
+# prueba si el primero no es concluyente, y solo cuenta si devuelve hangul de verdad
+PROBE_READERS = (
+    ('ja', ('ja', 'zh', 'auto')),
+    ('ko', ('ko',)),
+)
+
+# Registro de lectores compartido por todo el proceso, indexado por la tupla de idiomas
+_readers = {}
+_readers_lock = threading.Lock()
+_loading_locks = {}
+
+
+# Caché de reconocimiento por contenido del recorte (LRU, por proceso) y contadores de las etapas
+_crop_cache = OrderedDict()
+_crop_cache_lock = threading.Lock()
+_stats = {
+    'pages': 0, 'detect_seconds': 0.0, 'recognize_seconds': 0.0, 'crops': 0, 'crop_cache_hits': 0,
+    'language_probes': 0, 'language_probe_fallbacks': 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _record_stat(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def get_ocr_stats():
+    """Tiempo acumulado por etapa y aciertos de la caché de recortes del proceso actual"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['crop_cache_hit_rate'] = stats['crop_cache_hits'] / stats['crops'] if stats['crops'] else 0.0
+    return stats
+
+
+def _crop_cache_get(key):
+    if key is None:
+        return None
+    with _crop_cache_lock:
+        value = _crop_cache.get(key)
+        if value is not None:
+            _crop_cache.move_to_end(key)
+        return value
+
+
+def clear_crop_cache():
+    with _crop_cache_lock:
+        _crop_cache.clear()
+
+
+def _crop_cache_put(key, value):
+    max_entries = getattr(settings, 'OCR_CROP_CACHE_SIZE', 5000)
+    if key is None or max_entries <= 0:
+        return
+    with _crop_cache_lock:
+        _crop_cache[key] = value
+        _crop_cache.move_to_end(key)
+        while len(_crop_cache) > max_entries:
+            _crop_cache.popitem(last=False)
+
+
+def classify_script(results, min_confidence=None):
+    """
+    Idioma de origen según las estadísticas de caracteres de unos recortes reconocidos
     
-    def get_reader(self, language):
-        if language not in self.readers:
-            lang_map = {
-                'ja': ['ja', 'en'],
-                'ko': ['ko', 'en'],
-                'zh': ['ch_sim', 'en'],
-                'auto': ['ko', 'en'],
-            }
-            
-            lang_list = lang_map.get(language, ['en', 'ko'])
-            
+    Args:
+        results: tuplas (bbox, texto, confianza) de la pasada de sondeo
+    
+    Returns:
+        str: 'ja', 'ko', 'zh', 'auto' (texto latino, lo cubre el lector por defecto)
+        o None si el texto no es concluyente (poca confianza o sin letras)
+    """
+    if min_confidence is None:
+        min_confidence = getattr(settings, 'OCR_LANGUAGE_PROBE_MIN_CONFIDENCE', 0.4)
+    
+    counts = {'hangul': 0, 'kana': 0, 'han': 0, 'latin': 0}
+    confidences = []
+    for _, text, prob in results:
+        confidences.append(float(prob))
+        for char in str(text):
+            code = ord(char)
+            if char.isascii() and char.isalpha():
+                counts['latin'] += 1
+                continue
+            for script, ranges in SCRIPT_RANGES.items():
+                if any(start <= code <= end for start, end in ranges):
+                    counts[script] += 1
+                    break
+    
+    total = sum(counts.values())
+    if not total or sum(confidences) / len(confidences) < min_confidence:
+        return None
+    
+    # Los kana solo aparecen en japonés, aunque sean minoría frente a los kanji
+    if counts['kana'] / total >= 0.1:
+        return 'ja'
+    if counts['hangul'] / total >= 0.3:
+        return 'ko'
+    if counts['han'] / total >= 0.3:
+        return 'zh'
+    if counts['latin'] / total >= 0.6:
+        return 'auto'
+    return None
+
+
+def get_lang_list(language):
+    return LANGUAGE_MAP.get(language, DEFAULT_LANG_LIST)
+
+
+def get_shared_reader(lang_list):
+    """
+    Devuelve el lector EasyOCR del proceso para una lista de idiomas, cargándolo si hace falta
+    
+    La carga se protege con un lock por clave: hilos concurrentes que piden el
+    mismo modelo esperan a la primera carga en lugar de cargarlo otra vez.
+    """
+    key = tuple(lang_list)
+    
+    reader = _readers.get(key)
+    if reader is not None:
+        return reader
+    
+    with _readers_lock:
+        loading_lock = _loading_locks.setdefault(key, threading.Lock())
+    
+    with loading_lock:
+        reader = _readers.get(key)
+        if reader is None:
             try:
-                self.readers[language] = easyocr.Reader(
-                    lang_list,
+                reader = easyocr.Reader(
+                    list(key),
                     gpu=False,
                     download_enabled=True,
                 )
-                logger.info(f"Lector OCR inicializado para {language} con lang_list={lang_list}")
             except Exception as e:
-                logger.error(f"Error al inicializar EasyOCR para {language}: {str(e)}")
+                logger.error(f"Error al inicializar EasyOCR para {key}: {str(e)}")
                 raise
-                
+            _readers[key] = reader
+            logger.info(f"Lector OCR cargado para lang_list={list(key)}")
+    
+    return reader
+
+
+def warm_up_readers(languages=None):
+    """
+    Precarga los lectores de los idiomas configurados (OCR_WARMUP_LANGUAGES)
+    
+    Con 'auto' también se cargan los lectores del sondeo de idioma, que se
+    usan antes que el de 'auto' en cada página.
+    """
+    if languages is None:
+        languages = getattr(settings, 'OCR_WARMUP_LANGUAGES', [])
+    
+    languages = list(languages)
+    if 'auto' in languages:
+        languages = [probe_language for probe_language, _ in PROBE_READERS] + languages
+    
+    for language in dict.fromkeys(languages):
+        try:
+            get_shared_reader(get_lang_list(language))
+        except Exception as e:
+            logger.warning(f"No se pudo precargar el lector OCR para {language}: {str(e)}")
+
+
+class OCRService:
+    def __init__(self, pool=None):
+        """
+        Args:
+            pool (OCRPool): si se indica, las franjas de las tiras altas se leen en paralelo en sus procesos
+        """
+        self.readers = {}
+        self.pool = pool
+    
+    def get_reader(self, language):
+        if language not in self.readers:
+            self.readers[language] = get_shared_reader(get_lang_list(language))
+        
         return self.readers[language]
     
     def _numpy_to_native(self, obj):
@@ -72,30 +246,16 @@ class OCRService:
         
         return text
     
-    def detect_text_regions(self, image_path, language='auto'):
+    def detect_text_regions(self, image_source, language='auto'):
+        """
+        Args:
+            image_source: ruta de la imagen, ndarray BGR o PageContext
+        """
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"No se pudo leer la imagen en {image_path}")
-            
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            gray = cv2.GaussianBlur(gray, (5, 5), 0)
+            image, _ = resolve_image(image_source)
             
-            debug_dir = os.path.dirname(os.path.dirname(image_path)) + '/results'
-            os.makedirs(debug_dir, exist_ok=True)
-            
-            reader = self.get_reader(language)
-            
-            results = reader.readtext(
-                image, 
-                detail=1,
-                paragraph=False,
-                rotation_info=[0],
-                width_ths=0.7,
-                height_ths=0.7,
-                contrast_ths=0.1,
-                text_threshold=0.4,
-            )
+            language = self.resolve_language(image, language)
+            results = self._read_text(image, language)
             
             text_regions = []
             for i, (bbox, text, prob) in enumerate(results):
@@ -148,11 +308,323 @@ class OCRService:
             
             logger.info(f"Se detectaron {len(text_regions)} regiones de texto y se combinaron en {len(merged_regions)}")
             return merged_regions
-            
+        
         except Exception as e:
             logger.error(f"Error al detectar texto en la imagen: {str(e)}")
             raise
     
+    def resolve_language(self, image, language):
+        """
+        Sustituye 'auto' por el idioma detectado en una pasada de sondeo barata
+        
+        Se detectan cajas sobre una copia reducida y se reconocen solo los
+        OCR_LANGUAGE_PROBE_CROPS recortes más grandes con el lector japonés,
+        que puede emitir kana y kanji: kana indica japonés y solo kanji, chino.
+        Si el resultado no es concluyente (el modelo japonés no conoce el
+        hangul y devuelve texto con poca confianza), se repite el sondeo una
+        vez con el lector coreano y solo se acepta 'ko' si devuelve hangul con
+        confianza suficiente. Un error cuesta como mucho una pasada más, pero
+        el lector del sondeo se carga aunque la página resulte coreana o china.
+        
+        Returns:
+            str: idioma a usar ('ja', 'ko', 'zh' o 'auto' si no se pudo decidir)
+        """
+        if language != 'auto' or not getattr(settings, 'OCR_AUTO_DETECT_LANGUAGE', True):
+            return language
+        
+        try:
+            gray, boxes = self._probe_boxes(self.get_reader(PROBE_READERS[0][0]), image)
+            if not boxes:
+                return language
+            
+            _record_stat('language_probes')
+            detected = None
+            for index, (probe_language, accepted) in enumerate(PROBE_READERS):
+                if index:
+                    _record_stat('language_probe_fallbacks')
+                reader = self.get_reader(probe_language)
+                guess = classify_script(self._recognize_boxes(reader, gray, boxes, []))
+                if guess in accepted:
+                    detected = guess
+                    break
+            
+            detected = detected or language
+            logger.info(f"Idioma detectado por sondeo: {detected} ({len(boxes)} recortes)")
+            return detected
+        except Exception as e:
+            logger.warning(f"Falló la detección del idioma, se usa el lector por defecto: {str(e)}")
+            return language
+    
+    def _probe_boxes(self, reader, image):
+        """
+        Cajas horizontales más grandes para el sondeo de idioma, en coordenadas de la imagen original
+        
+        En tiras altas se recorren franjas de OCR_TILE_HEIGHT hasta reunir
+        suficientes recortes, en lugar de reducir la tira entera hasta que el
+        texto sea ilegible para el detector.
+        
+        Returns:
+            tuple: (imagen en gris, [[x_min, x_max, y_min, y_max], ...])
+        """
+        max_crops = getattr(settings, 'OCR_LANGUAGE_PROBE_CROPS', 8)
+        max_side = getattr(settings, 'OCR_LANGUAGE_PROBE_MAX_SIDE', 1024)
+        tile_height = getattr(settings, 'OCR_TILE_HEIGHT', 1600)
+        height = image.shape[0]
+        
+        ranges = [(0, height)]
+        if height > tile_height * 1.5:
+            ranges = [(top, min(height, top + tile_height)) for top in self._tile_offsets(height, tile_height, 0)]
+        
+        boxes = []
+        for top, bottom in ranges:
+            band = image[top:bottom]
+            long_side = max(band.shape[:2])
+            scale = min(1.0, max_side / float(long_side)) if max_side else 1.0
+            horizontal_list, _ = self._detect_boxes(reader, band, scale)
+            boxes.extend([x_min, x_max, y_min + top, y_max + top] for x_min, x_max, y_min, y_max in horizontal_list)
+            if len(boxes) >= max_crops:
+                break
+        
+        boxes.sort(key=lambda box: (box[1] - box[0]) * (box[3] - box[2]), reverse=True)
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return gray, boxes[:max_crops]
+    
+    def _readtext_raw(self, reader, image):
+        return reader.readtext(
+            image, 
+            detail=1,
+            paragraph=False,
+            rotation_info=[0],
+            width_ths=0.7,
+            height_ths=0.7,
+            contrast_ths=0.1,
+            text_threshold=0.4,
+        )
+    
+    def _readtext(self, reader, image, max_side=None, full_res_recognition=None):
+        """
+        OCR de una imagen en dos etapas: detección de cajas y reconocimiento por lotes de los recortes
+        
+        Si el lado mayor supera OCR_DETECTION_MAX_SIDE, la detección se hace en
+        una copia reducida y las cajas se devuelven en coordenadas de la imagen
+        original. Con OCR_RECOGNIZE_FULL_RES el reconocimiento se hace sobre los
+        recortes a resolución completa; si no, sobre la copia reducida. Con
+        OCR_TWO_STAGE desactivado se usa la llamada única a readtext.
+        
+        Returns:
+            list: tuplas (bbox de 4 puntos, texto, confianza) como readtext
+        """
+        if max_side is None:
+            max_side = getattr(settings, 'OCR_DETECTION_MAX_SIDE', 0)
+        if full_res_recognition is None:
+            full_res_recognition = getattr(settings, 'OCR_RECOGNIZE_FULL_RES', True)
+        
+        long_side = max(image.shape[:2])
+        scale = 1.0
+        if max_side and long_side > max_side:
+            scale = max_side / float(long_side)
+        
+        if scale < 1.0 and not full_res_recognition:
+            small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            return [
+                ([[x / scale, y / scale] for x, y in bbox], text, prob)
+                for bbox, text, prob in self._readtext(reader, small, max_side=0)
+            ]
+        
+        if not getattr(settings, 'OCR_TWO_STAGE', True) and scale == 1.0:
+            return self._readtext_raw(reader, image)
+        
+        horizontal_list, free_list = self._detect_boxes(reader, image, scale)
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return self._recognize_boxes(reader, gray, horizontal_list, free_list)
+    
+    def _detect_boxes(self, reader, image, scale=1.0):
+        """
+        Etapa de detección: cajas de texto en coordenadas de ``image``
+        
+        Returns:
+            tuple: ([x_min, x_max, y_min, y_max], ...), ([[x, y] x 4], ...)
+        """
+        started = time.perf_counter()
+        detection_image = image
+        if scale < 1.0:
+            detection_image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        horizontal_list, free_list = reader.detect(
+            detection_image,
+            text_threshold=0.4,
+            width_ths=0.7,
+            height_ths=0.7,
+        )
+        # detect devuelve una lista por imagen
+        horizontal_list = [[int(round(value / scale)) for value in box] for box in horizontal_list[0]]
+        free_list = [[[int(round(x / scale)), int(round(y / scale))] for x, y in box] for box in free_list[0]]
+        
+        _record_stat('detect_seconds', time.perf_counter() - started)
+        _record_stat('pages')
+        return horizontal_list, free_list
+    
+    def _box_points(self, box, horizontal):
+        if horizontal:
+            x_min, x_max, y_min, y_max = box
+            return [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+        return [list(point) for point in box]
+    
+    def _crop_key(self, reader, gray, points):
+        """Hash del contenido del recorte (y de los idiomas del lector) para la caché de reconocimiento"""
+        x_min, y_min, x_max, y_max = self._box_rect(points)
+        crop = gray[max(0, y_min):max(0, y_max), max(0, x_min):max(0, x_max)]
+        if crop.size == 0:
+            return None
+        digest = hashlib.sha1(np.ascontiguousarray(crop).tobytes()).hexdigest()
+        return (tuple(getattr(reader, 'lang_list', ())), crop.shape, digest)
+    
+    def _recognize_boxes(self, reader, gray, horizontal_list, free_list):
+        """
+        Etapa de reconocimiento: lee por lotes (OCR_RECOGNITION_BATCH_SIZE) solo los recortes que no están en caché
+        
+        Los recortes idénticos (mismas onomatopeyas o logotipos repetidos a lo
+        largo de un capítulo) se reconocen una sola vez por proceso.
+        """
+        boxes = [(box, True) for box in horizontal_list] + [(box, False) for box in free_list]
+        
+        results = []
+        pending = []
+        pending_horizontal = []
+        pending_free = []
+        for box, horizontal in boxes:
+            points = self._box_points(box, horizontal)
+            key = self._crop_key(reader, gray, points)
+            cached = _crop_cache_get(key)
+            if cached is not None:
+                results.append((points, cached[0], cached[1]))
+                continue
+            
+            pending.append((points, key))
+            (pending_horizontal if horizontal else pending_free).append(box)
+        
+        _record_stat('crops', len(boxes))
+        _record_stat('crop_cache_hits', len(boxes) - len(pending))
+        
+        if pending:
+            started = time.perf_counter()
+            recognized = reader.recognize(
+                gray,
+                pending_horizontal,
+                pending_free,
+                detail=1,
+                paragraph=False,
+                rotation_info=[0],
+                contrast_ths=0.1,
+                batch_size=getattr(settings, 'OCR_RECOGNITION_BATCH_SIZE', 8),
+            )
+            _record_stat('recognize_seconds', time.perf_counter() - started)
+            
+            # recognize reordena los recortes; se emparejan con su caja por solapamiento
+            for bbox, text, prob in recognized:
+                rect = self._box_rect(bbox)
+                best = max(pending, key=lambda item: self._overlap_scores(rect, self._box_rect(item[0]))[0])
+                _crop_cache_put(best[1], (text, prob))
+                results.append((bbox, text, prob))
+        
+        return results
+    
+    def _read_text(self, image, language):
+        """OCR de la página completa, o por franjas si es una tira vertical muy alta"""
+        tile_height = getattr(settings, 'OCR_TILE_HEIGHT', 1600)
+        
+        if not getattr(settings, 'OCR_TILING_ENABLED', True) or image.shape[0] <= tile_height * 1.5:
+            return self._readtext(self.get_reader(language), image)
+        
+        return self._read_tiled(image, language, tile_height, getattr(settings, 'OCR_TILE_OVERLAP', 200))
+    
+    def _tile_offsets(self, height, tile_height, overlap):
+        """Inicio de cada franja; la última se ajusta al borde inferior"""
+        step = max(1, tile_height - overlap)
+        offsets = list(range(0, max(1, height - overlap), step))
+        if offsets[-1] + tile_height < height:
+            offsets.append(height - tile_height)
+        return sorted({min(offset, max(0, height - tile_height)) for offset in offsets})
+    
+    def _read_tiled(self, image, language, tile_height, overlap):
+        """
+        OCR por franjas horizontales solapadas de altura fija
+        
+        Cada franja es una vista del array (sin copia), así que la memoria del
+        detector depende de la altura de la franja y no de la de la tira, y el
+        texto pequeño no se pierde por el reescalado a canvas_size. Las cajas se
+        trasladan a coordenadas de la página y las duplicadas en las zonas de
+        solape se fusionan. El solape debe superar la altura de una línea de texto
+        para que cada línea aparezca entera en alguna franja. Con un pool, las
+        franjas se leen en paralelo en sus procesos.
+        """
+        offsets = self._tile_offsets(image.shape[0], tile_height, overlap)
+        
+        if self.pool is not None:
+            tile_results = self.pool.read_tiles(image, language, [(offset, offset + tile_height) for offset in offsets])
+        else:
+            reader = self.get_reader(language)
+            tile_results = [self._readtext(reader, image[offset:offset + tile_height]) for offset in offsets]
+        
+        results = []
+        for offset, tile_result in zip(offsets, tile_results):
+            for bbox, text, prob in tile_result:
+                results.append(([[x, y + offset] for x, y in bbox], text, prob))
+        
+        merged = self._merge_tile_duplicates(results)
+        logger.info(f"OCR por franjas: {len(offsets)} franjas de {tile_height}px, {len(results)} cajas → {len(merged)}")
+        return merged
+    
+    def _box_rect(self, bbox):
+        xs = [point[0] for point in bbox]
+        ys = [point[1] for point in bbox]
+        return min(xs), min(ys), max(xs), max(ys)
+    
+    def _overlap_scores(self, rect_a, rect_b):
+        """(IoU, intersección / área menor) de dos rectángulos x1, y1, x2, y2"""
+        inter_w = min(rect_a[2], rect_b[2]) - max(rect_a[0], rect_b[0])
+        inter_h = min(rect_a[3], rect_b[3]) - max(rect_a[1], rect_b[1])
+        if inter_w <= 0 or inter_h <= 0:
+            return 0.0, 0.0
+        
+        inter = inter_w * inter_h
+        area_a = (rect_a[2] - rect_a[0]) * (rect_a[3] - rect_a[1])
+        area_b = (rect_b[2] - rect_b[0]) * (rect_b[3] - rect_b[1])
+        return inter / float(area_a + area_b - inter), inter / float(max(1, min(area_a, area_b)))
+    
+    def _merge_tile_duplicates(self, results):
+        """
+        Elimina las cajas repetidas en las zonas de solape
+        
+        Dos cajas son la misma si su IoU supera OCR_TILE_IOU_THRESHOLD o si una
+        está casi contenida en la otra (texto cortado en el borde de una franja).
+        Se conserva la mayor y, a igualdad, la de más confianza.
+        """
+        iou_threshold = getattr(settings, 'OCR_TILE_IOU_THRESHOLD', 0.5)
+        
+        candidates = sorted(
+            results,
+            key=lambda result: (self._rect_area(self._box_rect(result[0])), result[2]),
+            reverse=True
+        )
+        
+        kept = []
+        for bbox, text, prob in candidates:
+            rect = self._box_rect(bbox)
+            duplicate = False
+            for kept_bbox, _, _ in kept:
+                iou, containment = self._overlap_scores(rect, self._box_rect(kept_bbox))
+                if iou > iou_threshold or containment > 0.8:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append((bbox, text, prob))
+        
+        return kept
+    
+    def _rect_area(self, rect):
+        return (rect[2] - rect[0]) * (rect[3] - rect[1])
+    
     def _group_into_paragraphs(self, regions, distance_threshold=50):
         if not regions:
             return []
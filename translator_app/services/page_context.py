@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+
+class PageContext:
+    """
+    Página de manga decodificada una sola vez y compartida entre OCR, borrado de texto y renderizado
+    
+    La imagen (BGR, como la devuelve cv2.imread) se lee de disco la primera vez
+    que se accede a ``image``; los servicios no deben modificarla en sitio.
+    """
+    
+    def __init__(self, image_path=None, image=None):
+        if image_path is None and image is None:
+            raise ValueError("Se necesita una ruta o una imagen decodificada")
+        self.image_path = image_path
+        self._image = image
+    
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = cv2.imread(self.image_path)
+            if self._image is None:
+                raise ValueError(f"No se pudo leer la imagen en {self.image_path}")
+        return self._image
+    
+    @property
+    def shape(self):
+        return self.image.shape
+
+
+def resolve_image(image_source):
+    """
+    Acepta una ruta, un ndarray o un PageContext
+    
+    Returns:
+        tuple: (imagen decodificada, ruta original o None)
+    """
+    if isinstance(image_source, PageContext):
+        return image_source.image, image_source.image_path
+    
+    if isinstance(image_source, np.ndarray):
+        return image_source, None
+    
+    return PageContext(image_source).image, image_source
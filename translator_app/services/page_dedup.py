@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageChops
+
+from ..models import MangaPage
+
+logger = logging.getLogger(__name__)
+
+
+def compute_content_hash(image_field):
+    """SHA-256 del archivo tal y como se subió"""
+    sha256 = hashlib.sha256()
+    image_field.open('rb')
+    try:
+        for chunk in image_field.chunks():
+            sha256.update(chunk)
+    finally:
+        image_field.close()
+    return sha256.hexdigest()
+
+
+def compute_perceptual_hash(image_field):
+    """dHash de 64 bits: estable frente a re-codificaciones y cambios de tamaño"""
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as image:
+            pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    finally:
+        image_field.close()
+    
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    
+    return f"{bits:016x}"
+
+
+def ensure_hashes(manga_page):
+    """Calcula y guarda los hashes de la página si aún no los tiene"""
+    update_fields = []
+    
+    if not manga_page.content_hash:
+        manga_page.content_hash = compute_content_hash(manga_page.original_image)
+        update_fields.append('content_hash')
+    
+    if getattr(settings, 'PAGE_DEDUP_PERCEPTUAL', False) and not manga_page.perceptual_hash:
+        try:
+            manga_page.perceptual_hash = compute_perceptual_hash(manga_page.original_image)
+            update_fields.append('perceptual_hash')
+        except Exception as e:
+            logger.warning(f"No se pudo calcular el hash perceptual: {str(e)}")
+    
+    if update_fields:
+        manga_page.save(update_fields=update_fields)
+
+
+def _load_grayscale(image_field):
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as image:
+            return image.convert('L')
+    finally:
+        image_field.close()
+
+
+def images_match(image_field, other_field):
+    """
+    Comprueba píxel a píxel que dos imágenes son la misma página
+    
+    El dHash de 9x8 apenas ve la rotulación: dos páginas con la misma
+    composición y distinto texto pueden compartirlo. Se exigen las mismas
+    dimensiones y que como mucho PAGE_DEDUP_MAX_DIFF_RATIO de los píxeles
+    difiera más de PAGE_DEDUP_PIXEL_THRESHOLD, lo que tolera el ruido de una
+    re-codificación pero no un texto distinto.
+    """
+    image = _load_grayscale(image_field)
+    other = _load_grayscale(other_field)
+    if image.size != other.size:
+        return False
+    
+    threshold = getattr(settings, 'PAGE_DEDUP_PIXEL_THRESHOLD', 48)
+    difference = ImageChops.difference(image, other).point(lambda value: 255 if value > threshold else 0)
+    changed = difference.histogram()[255]
+    return changed <= getattr(settings, 'PAGE_DEDUP_MAX_DIFF_RATIO', 0.0005) * image.size[0] * image.size[1]
+
+
+def find_duplicate(manga_page):
+    """Busca una página completada con la misma imagen y el mismo par de idiomas"""
+    candidates = MangaPage.objects.filter(
+        status='completed',
+        source_language=manga_page.source_language,
+        target_language=manga_page.target_language,
+        translated_image__isnull=False,
+    ).exclude(id=manga_page.id).exclude(translated_image='').order_by('-updated_at')
+    
+    duplicate = candidates.filter(content_hash=manga_page.content_hash).first()
+    
+    if duplicate is None and manga_page.perceptual_hash:
+        # El hash perceptual solo propone candidatos; se confirman comparando los píxeles
+        for candidate in candidates.filter(perceptual_hash=manga_page.perceptual_hash)[:5]:
+            try:
+                if images_match(manga_page.original_image, candidate.original_image):
+                    return candidate
+            except Exception as e:
+                logger.warning(f"No se pudo comparar la página {manga_page.id} con la {candidate.id}: {str(e)}")
+    
+    return duplicate
+
+
+def reuse_existing_translation(manga_page):
+    """
+    Si la imagen ya se tradujo antes, copia su resultado en lugar de repetir OCR, traducción y renderizado
+    
+    Returns:
+        bool: True si la página quedó completada reutilizando otra
+    """
+    if not getattr(settings, 'PAGE_DEDUP_ENABLED', True):
+        return False
+    
+    try:
+        ensure_hashes(manga_page)
+        duplicate = find_duplicate(manga_page)
+        if duplicate is None:
+            return False
+        
+        duplicate.translated_image.open('rb')
+        try:
+            translated_bytes = duplicate.translated_image.read()
+        finally:
+            duplicate.translated_image.close()
+    except Exception as e:
+        logger.warning(f"No se pudo comprobar duplicados de la página {manga_page.id}: {str(e)}")
+        return False
+    
+    manga_page.detected_text = duplicate.detected_text
+    manga_page.translated_text = duplicate.translated_text
+    manga_page.translated_image.save(
+        os.path.basename(duplicate.translated_image.name),
+        ContentFile(translated_bytes),
+        save=False
+    )
+    manga_page.status = 'completed'
+    manga_page.save()
+    
+    logger.info(f"Página {manga_page.id} reutiliza la traducción de la página {duplicate.id}")
+    return True
@@ -0,0 +1,54 @@
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import ProgressEvent
+
+logger = logging.getLogger(__name__)
+
+# Etapas que cierran el flujo de eventos de una página
+FINAL_STAGES = ('completed', 'failed')
+
+
+def is_enabled():
+    return getattr(settings, 'PROGRESS_EVENTS_ENABLED', True)
+
+
+def emit(manga_page_id, stage, **data):
+    """
+    Registra un evento de progreso de la página
+
+    Los eventos se guardan en la base de datos porque el pipeline corre en los
+    procesos de run_translation_worker, no en el del servidor que los sirve.
+    Un fallo al registrar nunca interrumpe el procesamiento.
+    """
+    if not is_enabled() or not manga_page_id:
+        return
+
+    try:
+        ProgressEvent.objects.create(manga_page_id=manga_page_id, stage=stage, data=data)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el evento '{stage}' de la página {manga_page_id}: {str(e)}")
+
+
+def reset(manga_page_id):
+    """Descarta los eventos de un procesamiento anterior de la página y los caducados de cualquier página"""
+    if not is_enabled():
+        return
+
+    try:
+        ProgressEvent.objects.filter(manga_page_id=manga_page_id).delete()
+
+        cutoff = timezone.now() - timedelta(hours=getattr(settings, 'PROGRESS_EVENT_RETENTION_HOURS', 24))
+        ProgressEvent.objects.filter(created_at__lt=cutoff).delete()
+    except Exception as e:
+        logger.warning(f"No se pudieron limpiar los eventos de la página {manga_page_id}: {str(e)}")
+
+
+def format_sse(event_id, stage, data):
+    """Serializa un evento con el formato de Server-Sent Events"""
+    payload = json.dumps({'stage': stage, **data})
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {stage}\ndata: {payload}\n\n"
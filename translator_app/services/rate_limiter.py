@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador token-bucket compartido entre hilos
+    
+    Args:
+        rate (float): tokens repuestos por segundo (0 = sin límite)
+        capacity (int): ráfaga máxima permitida
+    """
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def _try_take(self, tokens):
+        """Toma los tokens si hay suficientes; si no, devuelve los segundos que faltan"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+    
+    def acquire(self, tokens=1):
+        """Bloquea hasta disponer de ``tokens`` tokens"""
+        if self.rate <= 0:
+            return
+        
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    async def acquire_async(self, tokens=1):
+        """Igual que acquire, pero espera sin bloquear el bucle de eventos"""
+        if self.rate <= 0:
+            return
+        
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(key, rate, capacity=None):
+    """Devuelve el limitador del proceso para un proveedor (p. ej. su base_url)"""
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            _buckets[key] = bucket
+        return bucket
@@ -0,0 +1,55 @@
+from collections import deque
+from django.conf import settings
+
+
+class TranslationContext:
+    """
+    Contexto de traducción de un capítulo: un resumen acumulado y las últimas líneas traducidas
+    
+    Se envía una sola vez por petición por lotes (no por región) para mantener
+    nombres y términos coherentes entre páginas. El resumen lo reescribe el
+    propio modelo en cada respuesta; las líneas recientes se añaden aquí.
+    """
+
+    def __init__(self, summary='', recent_lines=None, max_recent_lines=None):
+        self.max_recent_lines = max_recent_lines or getattr(settings, 'CHAPTER_CONTEXT_RECENT_LINES', 6)
+        self.summary = summary or ''
+        self.recent_lines = deque(recent_lines or [], maxlen=self.max_recent_lines)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(
+            summary=data.get('summary', ''),
+            recent_lines=[tuple(line) for line in data.get('recent_lines', [])],
+        )
+
+    def to_dict(self):
+        return {
+            'summary': self.summary,
+            'recent_lines': [list(line) for line in self.recent_lines],
+        }
+
+    def is_empty(self):
+        return not self.summary and not self.recent_lines
+
+    def add_lines(self, pairs):
+        """Añade pares (original, traducción) en orden de lectura"""
+        for source, translated in pairs:
+            if source and translated and not translated.startswith('Error:'):
+                self.recent_lines.append((source, translated))
+
+    def update_summary(self, summary):
+        summary = (summary or '').strip()
+        if summary:
+            self.summary = summary[:getattr(settings, 'CHAPTER_CONTEXT_SUMMARY_MAX_CHARS', 600)]
+
+    def render(self):
+        """Bloque de texto para el prompt; cadena vacía si aún no hay contexto"""
+        parts = []
+        if self.summary:
+            parts.append(f"Resumen del capítulo hasta ahora: {self.summary}")
+        if self.recent_lines:
+            lines = "\n".join(f"- {source} → {translated}" for source, translated in self.recent_lines)
+            parts.append(f"Últimas líneas traducidas:\n{lines}")
+        return "\n\n".join(parts)
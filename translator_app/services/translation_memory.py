@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import TranslationMemoryEntry
+
+logger = logging.getLogger(__name__)
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0}
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'TRANSLATION_MEMORY_ENABLED', True)
+
+
+def normalize_text(text):
+    """Normaliza el texto (ya pasado por clean_ocr_text) para usarlo como clave"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _ttl_cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'TRANSLATION_MEMORY_TTL_DAYS', 90))
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def get_stats():
+    """Contadores de aciertos/fallos del proceso actual"""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def lookup_many(texts, source_lang, target_lang, model_name, prompt_version):
+    """
+    Busca traducciones en memoria para varios textos con una sola consulta
+    
+    Args:
+        model_name: modelo, o lista de modelos aceptables (p. ej. los de todos los proveedores del router)
+    
+    Returns:
+        dict: {texto normalizado: traducción} solo para los aciertos
+    """
+    if not is_enabled():
+        return {}
+    
+    by_hash = {_text_hash(normalize_text(text)): normalize_text(text) for text in texts if text}
+    if not by_hash:
+        return {}
+    
+    try:
+        entries = list(
+            TranslationMemoryEntry.objects.filter(
+                text_hash__in=list(by_hash),
+                source_language=source_lang,
+                target_language=target_lang,
+                model_name__in=[model_name] if isinstance(model_name, str) else list(model_name),
+                prompt_version=prompt_version,
+                created_at__gte=_ttl_cutoff(),
+            ).values_list('id', 'text_hash', 'translated_text')
+        )
+        
+        if entries:
+            TranslationMemoryEntry.objects.filter(id__in=[entry_id for entry_id, _, _ in entries]).update(
+                hit_count=F('hit_count') + 1,
+                last_used_at=timezone.now(),
+            )
+    except Exception as e:
+        logger.warning(f"No se pudo consultar la memoria de traducción: {str(e)}")
+        return {}
+    
+    found = {by_hash[text_hash]: translated for _, text_hash, translated in entries}
+    _count('hits', len(found))
+    _count('misses', len(by_hash) - len(found))
+    return found
+
+
+def lookup(text, source_lang, target_lang, model_name, prompt_version):
+    return lookup_many([text], source_lang, target_lang, model_name, prompt_version).get(normalize_text(text))
+
+
+def store_many(translations, source_lang, target_lang, model_name, prompt_version):
+    """Guarda {texto original: traducción}; las claves ya existentes se ignoran"""
+    if not is_enabled():
+        return
+    
+    entries = {}
+    for text, translated in translations.items():
+        normalized = normalize_text(text)
+        if normalized and translated:
+            entries[_text_hash(normalized)] = TranslationMemoryEntry(
+                text_hash=_text_hash(normalized),
+                source_text=normalized,
+                translated_text=translated,
+                source_language=source_lang,
+                target_language=target_lang,
+                model_name=model_name,
+                prompt_version=prompt_version,
+            )
+    
+    if not entries:
+        return
+    
+    try:
+        TranslationMemoryEntry.objects.bulk_create(entries.values(), ignore_conflicts=True)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar en la memoria de traducción: {str(e)}")
+        return
+    
+    with _stats_lock:
+        previous = _stats['stores']
+        _stats['stores'] += len(entries)
+        current = _stats['stores']
+    
+    evict_every = getattr(settings, 'TRANSLATION_MEMORY_EVICT_EVERY', 500)
+    if evict_every and previous // evict_every != current // evict_every:
+        evict()
+
+
+def store(text, translated, source_lang, target_lang, model_name, prompt_version):
+    store_many({text: translated}, source_lang, target_lang, model_name, prompt_version)
+
+
+def evict():
+    """Elimina entradas caducadas (TTL) y las menos usadas por encima de TRANSLATION_MEMORY_MAX_ENTRIES (LRU)"""
+    try:
+        expired, _ = TranslationMemoryEntry.objects.filter(created_at__lt=_ttl_cutoff()).delete()
+        
+        evicted = 0
+        max_entries = getattr(settings, 'TRANSLATION_MEMORY_MAX_ENTRIES', 50000)
+        boundary = list(
+            TranslationMemoryEntry.objects.order_by('-last_used_at')
+            .values_list('last_used_at', flat=True)[max_entries:max_entries + 1]
+        )
+        if boundary:
+            evicted, _ = TranslationMemoryEntry.objects.filter(last_used_at__lte=boundary[0]).delete()
+        
+        if expired or evicted:
+            logger.info(f"Memoria de traducción: {expired} entradas caducadas y {evicted} expulsadas por LRU")
+    except Exception as e:
+        logger.warning(f"Error al depurar la memoria de traducción: {str(e)}")
@@ -0,0 +1,276 @@
+import os
+import json
+import logging
+import numpy as np
+from django.shortcuts import get_object_or_404
+from django.core.files.base import ContentFile
+
+from ..models import MangaPage, compute_mask_hash
+from .ocr_pool import get_ocr_pool
+from .ocr_service import OCRService
+from .deepseek_api import DeepseekAPIService
+from .image_processor import ImageProcessor
+from .page_context import PageContext
+from .page_dedup import reuse_existing_translation
+from . import progress
+
+logger = logging.getLogger(__name__)
+
+# Función de ayuda para convertir tipos NumPy a tipos nativos de Python
+def numpy_to_python_types(obj):
+    """Convierte cualquier tipo NumPy en tipos nativos de Python para serialización JSON"""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, list):
+        return [numpy_to_python_types(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: numpy_to_python_types(value) for key, value in obj.items()}
+    else:
+        return obj
+
+def load_clean_plate(manga_page, image_processor):
+    """Devuelve la imagen sin texto guardada y su plan de renderizado, o (None, None)"""
+    if not manga_page.clean_plate or not manga_page.render_plan or manga_page.clean_plate_is_stale():
+        return None, None
+    
+    try:
+        manga_page.clean_plate.open('rb')
+        try:
+            plate = image_processor.decode_image(manga_page.clean_plate.read())
+        finally:
+            manga_page.clean_plate.close()
+    except Exception as e:
+        logger.warning(f"No se pudo cargar la imagen sin texto de la página {manga_page.id}: {str(e)}")
+        return None, None
+    
+    return plate, manga_page.render_plan
+
+def save_translated_image(manga_page, image_processor, image_source, regions, reuse_plate=False, on_stage=None):
+    """
+    Renderiza la traducción y la guarda directamente en el storage, sin archivos temporales
+    
+    Con ``reuse_plate`` se parte de la imagen sin texto y del plan guardados, de
+    modo que solo se procesan las regiones que cambiaron.
+    """
+    plate, plan = load_clean_plate(manga_page, image_processor) if reuse_plate else (None, None)
+    
+    final_image, new_plate, new_plan = image_processor.render_with_plan(
+        image_source,
+        regions,
+        manga_page.target_language,
+        plate=plate,
+        plan=plan,
+        on_stage=on_stage
+    )
+    
+    name, ext = os.path.splitext(os.path.basename(manga_page.original_image.name))
+    
+    if new_plate is not plate:
+        if manga_page.clean_plate:
+            manga_page.clean_plate.delete(save=False)
+        manga_page.clean_plate.save(
+            f"{name}_plate.png",
+            ContentFile(image_processor.encode_image(new_plate, '.png')),
+            save=False
+        )
+        manga_page.clean_plate_mask_hash = compute_mask_hash(manga_page.detected_text)
+    manga_page.render_plan = new_plan
+    
+    content = image_processor.encode_image(final_image, ext)
+    
+    manga_page.translated_image.save(
+        f"{name}_translated{ext or '.jpg'}",
+        ContentFile(content),
+        save=True
+    )
+
+# Etapas del pipeline (usadas por process_manga_translation y por el pipeline de capítulos)
+def start_page_processing(manga_page):
+    """
+    Marca la página como 'processing'
+    
+    Returns:
+        bool: False si la página se completó reutilizando una traducción idéntica
+    """
+    progress.reset(manga_page.id)
+    
+    if reuse_existing_translation(manga_page):
+        progress.emit(manga_page.id, 'completed', reused=True)
+        return False
+    
+    manga_page.status = 'processing'
+    manga_page.save()
+    progress.emit(manga_page.id, 'started')
+    return True
+
+def mark_page_failed(manga_page, error):
+    """
+    Registra el fallo de una página
+    
+    Ni el estado 'failed' ni el evento se escriben aquí: los escribe fail_job
+    solo si el trabajo no se va a reintentar. Hasta entonces la página sigue
+    'processing', para que el cliente no dé por terminada una página que
+    volverá a la cola (p. ej. mientras el resto del capítulo sigue en marcha).
+    """
+    logger.error(f"Error al procesar la traducción de la página {manga_page.id}: {str(error)}")
+
+def run_ocr_stage(manga_page, page=None, ocr_service=None):
+    """
+    Detecta el texto de la página y lo guarda en detected_text
+    
+    Returns:
+        tuple: (PageContext con la imagen decodificada, regiones detectadas);
+        sin texto las regiones son una lista vacía y la página se completa con
+        complete_page_without_text
+    """
+    # Decodificar la imagen original una sola vez para todo el pipeline
+    if page is None:
+        page = PageContext(manga_page.original_image.path)
+    
+    height, width = page.shape[:2]
+    progress.emit(manga_page.id, 'decoded', width=width, height=height)
+    
+    # Con OCR_POOL_PROCESSES, las franjas de las tiras altas se reparten entre los procesos del pool
+    ocr_service = ocr_service or OCRService(pool=get_ocr_pool())
+    text_regions = ocr_service.detect_text_regions(
+        page, 
+        manga_page.source_language
+    )
+    
+    # Convertir a tipos nativos de Python para serialización JSON
+    text_regions = numpy_to_python_types(text_regions)
+    
+    # Verificar que sea serializable antes de guardar
+    try:
+        json_text = json.dumps(text_regions)
+        # Guardar texto detectado
+        manga_page.detected_text = text_regions
+        manga_page.save()
+    except TypeError as e:
+        logger.error(f"Error al serializar texto detectado: {str(e)}")
+        # Si no es serializable, intentar convertir manualmente
+        serializable_regions = []
+        for region in text_regions:
+            clean_region = {
+                'id': int(region.get('id', 0)),
+                'text': str(region.get('text', '')),
+                'confidence': float(region.get('confidence', 0.0)),
+                'bbox': [[int(x), int(y)] for x, y in region.get('bbox', [])],
+                'bbox_simple': [int(x) for x in region.get('bbox_simple', [0, 0, 0, 0])],
+                'language_detected': str(region.get('language_detected', 'unknown')),
+            }
+            serializable_regions.append(clean_region)
+        
+        manga_page.detected_text = serializable_regions
+        manga_page.save()
+        text_regions = serializable_regions
+    
+    if not text_regions:
+        # Una página sin texto no es un error: reintentarla daría el mismo resultado
+        logger.warning(f"No se detectó texto en la página {manga_page.id}")
+    
+    progress.emit(manga_page.id, 'ocr', regions=len(text_regions))
+    return page, text_regions
+
+def complete_page_without_text(manga_page):
+    """Completa una página sin texto detectado usando la imagen original como traducida"""
+    name, ext = os.path.splitext(os.path.basename(manga_page.original_image.name))
+    manga_page.original_image.open('rb')
+    try:
+        content = manga_page.original_image.read()
+    finally:
+        manga_page.original_image.close()
+    
+    manga_page.translated_text = []
+    manga_page.translated_image.save(
+        f"{name}_translated{ext or '.jpg'}",
+        ContentFile(content),
+        save=False
+    )
+    manga_page.status = 'completed'
+    manga_page.save()
+    progress.emit(manga_page.id, 'completed', regions=0)
+
+def save_translated_regions(manga_page, translated_regions):
+    # Convertir a tipos nativos para serialización
+    translated_regions = numpy_to_python_types(translated_regions)
+    
+    # Guardar texto traducido
+    manga_page.translated_text = translated_regions
+    manga_page.save()
+    
+    return translated_regions
+
+def run_translation_stage(manga_page, text_regions, deepseek_service=None, context=None):
+    """Traduce las regiones detectadas y las guarda en translated_text"""
+    deepseek_service = deepseek_service or DeepseekAPIService()
+    translated_regions = deepseek_service.translate_manga_text(
+        text_regions,
+        manga_page.source_language,
+        manga_page.target_language,
+        context=context,
+        on_progress=lambda done, total: progress.emit(manga_page.id, 'translated', done=done, total=total)
+    )
+    
+    return save_translated_regions(manga_page, translated_regions)
+
+def run_translation_stage_many(manga_pages, pages_regions, deepseek_service=None, context=None):
+    """Traduce varias páginas del mismo par de idiomas en las mismas peticiones"""
+    deepseek_service = deepseek_service or DeepseekAPIService()
+    results = deepseek_service.translate_pages(
+        pages_regions,
+        manga_pages[0].source_language,
+        manga_pages[0].target_language,
+        context=context
+    )
+    
+    saved = []
+    for manga_page, translated_regions in zip(manga_pages, results):
+        saved.append(save_translated_regions(manga_page, translated_regions))
+        total = sum(1 for region in translated_regions if region.get('text'))
+        progress.emit(manga_page.id, 'translated', done=total, total=total)
+    return saved
+
+def run_render_stage(manga_page, page, translated_regions, image_processor=None):
+    """Renderiza la imagen traducida, la guarda en el modelo y completa la página"""
+    # Partir de la imagen sin texto si ya existe una para las mismas cajas detectadas
+    image_processor = image_processor or ImageProcessor()
+    save_translated_image(
+        manga_page, image_processor, page, translated_regions, reuse_plate=True,
+        on_stage=lambda stage: progress.emit(manga_page.id, stage)
+    )
+    progress.emit(manga_page.id, 'rendered')
+    
+    # Actualizar estado a 'completado'
+    manga_page.status = 'completed'
+    manga_page.save()
+    progress.emit(manga_page.id, 'completed')
+
+def process_manga_translation(manga_page_id):
+    """
+    Procesa la traducción de una página de manga
+    
+    Args:
+        manga_page_id (int): ID de la página de manga a procesar
+    """
+    # Obtener la página de manga
+    manga_page = get_object_or_404(MangaPage, id=manga_page_id)
+    
+    # Reutilizar el resultado si la misma imagen ya se tradujo con el mismo par de idiomas
+    if not start_page_processing(manga_page):
+        return
+    
+    try:
+        page, text_regions = run_ocr_stage(manga_page)
+        if not text_regions:
+            complete_page_without_text(manga_page)
+            return
+        translated_regions = run_translation_stage(manga_page, text_regions)
+        run_render_stage(manga_page, page, translated_regions)
+    except Exception as e:
+        mark_page_failed(manga_page, e)
+        raise
@@ -1,28 +1,74 @@
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Manga Translator JS initialized');
     
+    const progressMessages = {
+        started: () => 'Preparando la página...',
+        decoded: data => `Imagen cargada (${data.width}×${data.height})`,
+        ocr: data => `Texto detectado: ${data.regions} regiones`,
+        translated: data => `Traduciendo: ${data.done}/${data.total}`,
+        inpainted: () => 'Texto original borrado',
+        rendered: () => 'Imagen traducida generada',
+        retrying: () => 'Error al procesar; la página volvió a la cola',
+    };
+    
     function updateTranslationStatus(translationId) {
         if (!translationId) return;
         
         fetch(`/api/translations/${translationId}/status/`)
             .then(response => response.json())
             .then(data => {
-                if (data.status === 'completed' && data.translated_image) {
+                if ((data.status === 'completed' && data.translated_image) || data.status === 'failed') {
                     window.location.reload();
-                } else if (data.status === 'processing') {
+                } else if (data.status === 'processing' || data.status === 'pending') {
                     setTimeout(() => updateTranslationStatus(translationId), 3000);
                 }
             })
             .catch(error => console.error('Error al verificar estado:', error));
     }
     
+    function followTranslationProgress(translationId) {
+        // Sin soporte de SSE se sigue consultando el estado periódicamente
+        if (!window.EventSource) {
+            updateTranslationStatus(translationId);
+            return;
+        }
+        
+        const progressElement = document.getElementById('translation-progress');
+        const source = new EventSource(`/api/translations/${translationId}/events/`);
+        
+        Object.keys(progressMessages).forEach(stage => {
+            source.addEventListener(stage, event => {
+                if (progressElement) {
+                    progressElement.textContent = progressMessages[stage](JSON.parse(event.data));
+                }
+            });
+        });
+        
+        ['completed', 'failed'].forEach(stage => {
+            source.addEventListener(stage, () => {
+                source.close();
+                // Se comprueba el estado real antes de recargar: si la página volvió
+                // a la cola, se sigue consultando en lugar de recargar en bucle
+                updateTranslationStatus(translationId);
+            });
+        });
+        
+        source.onerror = () => {
+            // EventSource se reconecta solo cuando el servidor cierra la conexión por tiempo;
+            // si no logra reconectar, se vuelve a la consulta periódica
+            if (source.readyState === EventSource.CLOSED) {
+                updateTranslationStatus(translationId);
+            }
+        };
+    }
+    
     const translationDetailElement = document.getElementById('translation-detail');
     if (translationDetailElement) {
         const translationId = translationDetailElement.dataset.translationId;
         const translationStatus = translationDetailElement.dataset.translationStatus;
         
-        if (translationStatus === 'processing') {
-            updateTranslationStatus(translationId);
+        if (translationStatus === 'processing' || translationStatus === 'pending') {
+            followTranslationProgress(translationId);
         }
     }
-});
\ No newline at end of file
+});
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .services.chapter_pipeline import _DONE, ChapterPipeline, _PageWork
+from .services.image_processor import ImageProcessor
+from .services.llm_router import LLMRouter, Provider, load_providers
+from .services.translation_context import TranslationContext
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Endpoint /v1/chat/completions compatible con OpenAI que responde con el nombre del servidor"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        
+        stub = self.server.stub
+        stub.requests += 1
+        time.sleep(stub.delay)
+        
+        if stub.failing:
+            body = json.dumps({'error': {'message': 'fallo simulado', 'type': 'server_error'}}).encode()
+            self.send_response(500)
+        else:
+            body = json.dumps({
+                'id': f'chatcmpl-{stub.name}-{stub.requests}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': stub.name,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': stub.name},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            }).encode()
+            self.send_response(200)
+        
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubProvider:
+    """Servidor HTTP local con latencia y fallos configurables"""
+
+    def __init__(self, name, delay=0.0, failing=False):
+        self.name = name
+        self.delay = delay
+        self.failing = failing
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def provider(self):
+        return Provider(self.name, self.base_url, 'test-key', 'stub-model')
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+ROUTER_ENV = {
+    'LLM_MAX_RETRIES': '0',
+    'LLM_HEDGING': 'true',
+    'LLM_HEDGE_MIN_SAMPLES': '3',
+    'LLM_HEDGE_MIN_DELAY': '0.05',
+    'LLM_MIN_HEALTH_SAMPLES': '3',
+    'LLM_MAX_ERROR_RATE': '0.5',
+    'TRANSLATION_RATE_LIMIT_RPS': '0',
+}
+
+
+class LLMRouterTests(SimpleTestCase):
+    """Enrutado entre un proveedor lento y uno que falla, contra servidores locales"""
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, ROUTER_ENV)
+        env.start()
+        self.addCleanup(env.stop)
+        
+        self.fast = StubProvider('fast')
+        self.slow = StubProvider('slow', delay=0.2)
+        self.broken = StubProvider('broken', failing=True)
+        for stub in (self.fast, self.slow, self.broken):
+            self.addCleanup(stub.stop)
+
+    def _chat(self, router):
+        response = router.chat(messages=[{'role': 'user', 'content': 'hola'}])
+        return response.choices[0].message.content
+
+    def _warm_up(self, router, provider, calls=3):
+        """Registra latencias reales del proveedor llamándolo directamente"""
+        for _ in range(calls):
+            try:
+                router._call(provider, {'messages': [{'role': 'user', 'content': 'hola'}]})
+            except Exception:
+                pass
+
+    def test_ranks_providers_by_recent_latency(self):
+        slow, fast = self.slow.provider(), self.fast.provider()
+        router = LLMRouter([slow, fast])
+        self._warm_up(router, slow)
+        self._warm_up(router, fast)
+        
+        self.assertEqual([provider.name for provider in router.ranked()], ['fast', 'slow'])
+        self.assertEqual(self._chat(router), 'fast')
+
+    def test_unhealthy_provider_is_ranked_last(self):
+        # El proveedor roto responde enseguida, pero su tasa de error supera el límite
+        broken, slow = self.broken.provider(), self.slow.provider()
+        router = LLMRouter([broken, slow])
+        self._warm_up(router, broken)
+        self._warm_up(router, slow)
+        
+        self.assertEqual(router.get_stats()['broken']['error_rate'], 1.0)
+        self.assertEqual([provider.name for provider in router.ranked()], ['slow', 'broken'])
+
+    def test_fails_over_to_next_provider(self):
+        router = LLMRouter([self.broken.provider(), self.slow.provider()])
+        router.hedging = False
+        
+        self.assertEqual(self._chat(router), 'slow')
+        self.assertEqual(self.broken.requests, 1)
+        self.assertEqual(router.get_stats()['broken']['error_rate'], 1.0)
+
+    def test_hedge_request_wins_when_primary_exceeds_p95(self):
+        fast, slow = self.fast.provider(), self.slow.provider()
+        router = LLMRouter([fast, slow])
+        self._warm_up(router, fast)
+        self._warm_up(router, slow)
+        
+        # El proveedor elegido se vuelve mucho más lento que su p95 reciente
+        self.fast.delay = 1.0
+        started = time.monotonic()
+        
+        self.assertEqual(self._chat(router), 'slow')
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_async_hedge_request_wins_when_primary_exceeds_p95(self):
+        fast, slow = self.fast.provider(), self.slow.provider()
+        router = LLMRouter([fast, slow])
+        self._warm_up(router, fast)
+        self._warm_up(router, slow)
+        self.fast.delay = 1.0
+        
+        async def chat():
+            response = await router.achat(messages=[{'role': 'user', 'content': 'hola'}])
+            return response.choices[0].message.content
+        
+        self.assertEqual(asyncio.run(chat()), 'slow')
+
+    def test_async_fails_over_to_next_provider(self):
+        router = LLMRouter([self.broken.provider(), self.fast.provider()])
+        router.hedging = False
+        
+        async def chat():
+            response = await router.achat(messages=[{'role': 'user', 'content': 'hola'}])
+            return response.choices[0].message.content
+        
+        self.assertEqual(asyncio.run(chat()), 'fast')
+
+
+class LoadProvidersTests(SimpleTestCase):
+
+    def test_per_provider_rate_limits_fall_back_to_global(self):
+        providers_env = json.dumps([
+            {'name': 'limited', 'base_url': 'http://127.0.0.1:1/v1', 'api_key': 'a', 'rate_limit_rps': 2, 'rate_limit_burst': 4},
+            {'name': 'default', 'base_url': 'http://127.0.0.1:2/v1', 'api_key': 'b'},
+        ])
+        env = {'LLM_PROVIDERS': providers_env, 'TRANSLATION_RATE_LIMIT_RPS': '5', 'TRANSLATION_RATE_LIMIT_BURST': '10'}
+        with mock.patch.dict(os.environ, env):
+            limited, default = load_providers()
+        
+        self.assertEqual((limited.rate_limiter.rate, limited.rate_limiter.capacity), (2.0, 4.0))
+        self.assertEqual((default.rate_limiter.rate, default.rate_limiter.capacity), (5.0, 10.0))
+
+
+class RenderPlanTests(SimpleTestCase):
+    """Reutilización del plan de renderizado entre ediciones de una página"""
+
+    def setUp(self):
+        self.processor = ImageProcessor()
+        self.image = np.full((400, 400, 3), 255, np.uint8)
+        self.region = {
+            'id': 0,
+            'text': '안녕',
+            'translated_text': 'Hola',
+            'bbox': [[20, 20], [120, 20], [120, 60], [20, 60]],
+            'bbox_simple': [20, 20, 100, 40],
+        }
+        _, self.plate, self.plan = self.processor.render_with_plan(self.image, [self.region], 'es')
+
+    def _render_again(self, region):
+        with mock.patch.object(self.processor, 'layout_region', wraps=self.processor.layout_region) as layout_region:
+            self.processor.render_with_plan(self.image, [region], 'es', plate=self.plate, plan=self.plan)
+        return layout_region
+
+    def test_unchanged_region_reuses_layout(self):
+        self.assertFalse(self._render_again(dict(self.region)).called)
+
+    def test_layout_recomputed_when_bbox_simple_moves(self):
+        # El editor solo cambia bbox_simple al mover o redimensionar una región
+        moved = dict(self.region, bbox_simple=[200, 250, 150, 60])
+        layout_region = self._render_again(moved)
+        
+        layout_region.assert_called_once()
+        self.assertEqual(layout_region.call_args[0][0]['bbox_simple'], [200, 250, 150, 60])
+
+
+class ChapterPipelineOrderTests(SimpleTestCase):
+    """Con contexto, la traducción recibe las páginas en orden de lectura"""
+
+    def setUp(self):
+        patches = [
+            mock.patch('translator_app.services.chapter_pipeline.DeepseekAPIService'),
+            mock.patch('translator_app.services.chapter_pipeline.ImageProcessor'),
+            mock.patch('translator_app.services.chapter_pipeline.get_ocr_pool', return_value=None),
+            mock.patch('translator_app.services.chapter_pipeline.OCRService'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.pipeline = ChapterPipeline(context=TranslationContext(), queue_size=10)
+
+    def _work(self, index):
+        return _PageWork(mock.Mock(id=index, page_number=index + 1), index)
+
+    def test_out_of_order_pages_are_translated_in_reading_order(self):
+        in_queue = queue.Queue()
+        for index in (2, 3, 0):
+            in_queue.put(self._work(index))
+        # La página 1 se completó en el OCR (p. ej. sin texto) y no llega a la traducción
+        self.pipeline._finish(self._work(1), None)
+        in_queue.put(_DONE)
+        
+        batches = []
+        stopping = False
+        while not stopping:
+            works, stopping = self.pipeline._take_ordered_batch(in_queue, 2)
+            batches.append([work.index for work in works])
+        
+        self.assertEqual(batches, [[0, 2], [3]])
+
+    def test_early_page_waits_for_the_previous_one(self):
+        in_queue = queue.Queue()
+        in_queue.put(self._work(1))
+        in_queue.put(self._work(0))
+        
+        works, stopping = self.pipeline._take_ordered_batch(in_queue, 1)
+        
+        self.assertEqual([work.index for work in works], [0])
+        self.assertFalse(stopping)
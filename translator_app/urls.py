@@ -14,9 +14,15 @@ urlpatterns = [
     # API endpoints (existentes)
     path('api/translate/', views.translate_page, name='api_translate'),
     path('api/translations/<int:pk>/status/', views.get_translation_status, name='api_translation_status'),
+    path('api/translations/<int:pk>/events/', views.translation_events, name='api_translation_events'),
     
     # Nuevos endpoints API para el editor
     path('api/translations/<int:pk>/update_regions/', views.update_translation_regions, name='api_update_regions'),
     path('api/translations/<int:pk>/regenerate/', views.regenerate_translation_image, name='api_regenerate_image'),
     path('api/translate_text/', views.translate_text, name='api_translate_text'),
+    path('api/metrics/', views.service_metrics, name='api_service_metrics'),
+    
+    # Capítulos (varias páginas en un solo envío)
+    path('api/chapters/translate/', views.translate_chapter, name='api_translate_chapter'),
+    path('api/chapters/<int:pk>/status/', views.get_chapter_status, name='api_chapter_status'),
 ]
\ No newline at end of file
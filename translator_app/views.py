@@ -1,41 +1,39 @@
 import os
+import re
 import json
+import time
+import asyncio
 import logging
-import numpy as np
+import mimetypes
+import zipfile
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import JsonResponse
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView, ListView, DetailView, CreateView
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.base import ContentFile
 
-from .models import MangaPage
+from .models import Chapter, MangaPage, ProgressEvent
 from .forms import MangaTranslationForm
-from .services.ocr_service import OCRService
 from .services.deepseek_api import DeepseekAPIService
 from .services.image_processor import ImageProcessor
+from .services.page_context import PageContext
+from .services.job_queue import enqueue_chapter, enqueue_translation
+from .services import llm_clients, translation_memory
+from .services.llm_router import get_router
+from .services.ocr_service import get_ocr_stats
+from .services.progress import FINAL_STAGES, format_sse
+from .services.translation_pipeline import process_manga_translation, save_translated_image
 
 logger = logging.getLogger(__name__)
 
-# Función de ayuda para convertir tipos NumPy a tipos nativos de Python
-def numpy_to_python_types(obj):
-    """Convierte cualquier tipo NumPy en tipos nativos de Python para serialización JSON"""
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, list):
-        return [numpy_to_python_types(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: numpy_to_python_types(value) for key, value in obj.items()}
-    else:
-        return obj
-
 # Vistas basadas en clases
 class HomeView(TemplateView):
     """Vista de la página de inicio"""
@@ -85,125 +83,20 @@ class MangaTranslationCreateView(CreateView):
         self.object.status = 'pending'
         self.object.save()
         
-        # Iniciar el proceso de traducción
+        # Encolar el procesamiento; un worker (run_translation_worker) lo ejecutará
         try:
-            # Procesamiento asíncrono (en un entorno real, esto debería hacerse con celery o similar)
-            process_manga_translation(self.object.id)
-            messages.success(self.request, "¡Imagen subida con éxito! La traducción está en proceso.")
+            if enqueue_translation(self.object) is None:
+                messages.success(self.request, "¡Imagen subida con éxito! Se reutilizó una traducción existente.")
+            else:
+                messages.success(self.request, "¡Imagen subida con éxito! La traducción está en cola.")
         except Exception as e:
-            logger.error(f"Error al iniciar el proceso de traducción: {str(e)}")
+            logger.error(f"Error al encolar el proceso de traducción: {str(e)}")
             self.object.status = 'failed'
             self.object.save()
             messages.error(self.request, f"Error al procesar la traducción: {str(e)}")
         
         return redirect(reverse('translation_detail', kwargs={'pk': self.object.id}))
 
-# Funciones auxiliares
-def process_manga_translation(manga_page_id):
-    """
-    Procesa la traducción de una página de manga
-    
-    Args:
-        manga_page_id (int): ID de la página de manga a procesar
-    """
-    # Obtener la página de manga
-    manga_page = get_object_or_404(MangaPage, id=manga_page_id)
-    
-    # Actualizar estado a 'procesando'
-    manga_page.status = 'processing'
-    manga_page.save()
-    
-    try:
-        # 1. Obtener ruta a la imagen original
-        image_path = manga_page.original_image.path
-        
-        # 2. Detectar texto en la imagen
-        ocr_service = OCRService()
-        text_regions = ocr_service.detect_text_regions(
-            image_path, 
-            manga_page.source_language
-        )
-        
-        # Convertir a tipos nativos de Python para serialización JSON
-        text_regions = numpy_to_python_types(text_regions)
-        
-        # Verificar que sea serializable antes de guardar
-        try:
-            json_text = json.dumps(text_regions)
-            # Guardar texto detectado
-            manga_page.detected_text = text_regions
-            manga_page.save()
-        except TypeError as e:
-            logger.error(f"Error al serializar texto detectado: {str(e)}")
-            # Si no es serializable, intentar convertir manualmente
-            serializable_regions = []
-            for region in text_regions:
-                clean_region = {
-                    'id': int(region.get('id', 0)),
-                    'text': str(region.get('text', '')),
-                    'confidence': float(region.get('confidence', 0.0)),
-                    'bbox': [[int(x), int(y)] for x, y in region.get('bbox', [])],
-                    'bbox_simple': [int(x) for x in region.get('bbox_simple', [0, 0, 0, 0])],
-                    'language_detected': str(region.get('language_detected', 'unknown')),
-                }
-                serializable_regions.append(clean_region)
-            
-            manga_page.detected_text = serializable_regions
-            manga_page.save()
-            text_regions = serializable_regions
-        
-        # 3. Traducir el texto detectado
-        if text_regions:
-            deepseek_service = DeepseekAPIService()
-            translated_regions = deepseek_service.translate_manga_text(
-                text_regions,
-                manga_page.source_language,
-                manga_page.target_language
-            )
-            
-            # Convertir a tipos nativos para serialización
-            translated_regions = numpy_to_python_types(translated_regions)
-            
-            # Guardar texto traducido
-            manga_page.translated_text = translated_regions
-            manga_page.save()
-            
-            # 4. Procesar la imagen
-            image_processor = ImageProcessor()
-            output_path = image_processor.process_manga_image(
-                image_path,
-                translated_regions,
-                manga_page.target_language
-            )
-            
-            # 5. Guardar la imagen traducida en el modelo
-            with open(output_path, 'rb') as f:
-                manga_page.translated_image.save(
-                    os.path.basename(output_path),
-                    ContentFile(f.read()),
-                    save=True
-                )
-            
-            # Actualizar estado a 'completado'
-            manga_page.status = 'completed'
-            manga_page.save()
-            
-            # Eliminar el archivo temporal si existe
-            if os.path.exists(output_path):
-                os.remove(output_path)
-        else:
-            # No se detectó texto
-            logger.warning("No se detectó texto en la imagen")
-            manga_page.status = 'failed'
-            manga_page.save()
-            raise ValueError("No se detectó texto en la imagen")
-    
-    except Exception as e:
-        logger.error(f"Error al procesar la traducción: {str(e)}")
-        manga_page.status = 'failed'
-        manga_page.save()
-        raise
-
 # API endpoints
 @csrf_exempt
 @require_POST
@@ -223,15 +116,17 @@ def translate_page(request):
             manga_page.status = 'pending'
             manga_page.save()
             
-            # Iniciar el proceso de traducción
+            # Encolar el procesamiento y responder de inmediato
             try:
-                process_manga_translation(manga_page.id)
+                job = enqueue_translation(manga_page)
                 return JsonResponse({
                     'id': manga_page.id,
                     'status': manga_page.status,
                     'original_image': manga_page.original_image.url,
                     'translated_image': manga_page.translated_image.url if manga_page.translated_image else None,
-                })
+                    'status_url': reverse('api_translation_status', kwargs={'pk': manga_page.id}),
+                    'events_url': reverse('api_translation_events', kwargs={'pk': manga_page.id}),
+                }, status=202 if job else 200)
             except Exception as e:
                 return JsonResponse({'error': str(e)}, status=500)
         else:
@@ -242,10 +137,14 @@ def translate_page(request):
         logger.error(f"Error en el endpoint de traducción: {str(e)}")
         return JsonResponse({'error': f"Error interno del servidor: {str(e)}"}, status=500)
 
-def get_translation_status(request, pk):
-    """Endpoint para verificar el estado de una traducción"""
+async def get_translation_status(request, pk):
+    """Endpoint para verificar el estado de una traducción (asíncrono, con el ORM asíncrono)"""
+    try:
+        manga_page = await MangaPage.objects.aget(id=pk)
+    except MangaPage.DoesNotExist:
+        return JsonResponse({'error': 'Traducción no encontrada'}, status=404)
+    
     try:
-        manga_page = get_object_or_404(MangaPage, id=pk)
         data = {
             'id': manga_page.id,
             'status': manga_page.status,
@@ -267,6 +166,271 @@ def get_translation_status(request, pk):
         return JsonResponse({'error': str(e)}, status=500)
     
 
+def _poll_progress(pk, last_id):
+    """
+    Lee los eventos nuevos de la página
+    
+    Returns:
+        tuple: (fragmentos SSE, último id enviado, True si el flujo terminó)
+    """
+    chunks = []
+    events = ProgressEvent.objects.filter(manga_page_id=pk, id__gt=last_id).values_list('id', 'stage', 'data')
+    for event_id, stage, data in events:
+        chunks.append(format_sse(event_id, stage, data))
+        last_id = event_id
+        if stage in FINAL_STAGES:
+            return chunks, last_id, True
+    
+    if not chunks:
+        # Páginas que terminaron sin eventos (p. ej. reutilizadas al encolar) o eliminadas
+        status = MangaPage.objects.filter(id=pk).values_list('status', flat=True).first()
+        if status is None or status in FINAL_STAGES:
+            chunks.append(format_sse(None, status or 'failed', {'status': status}))
+            return chunks, last_id, True
+    
+    return chunks, last_id, False
+
+def _progress_stream(pk, last_id):
+    """Flujo SSE para servidores WSGI: ocupa un hilo mientras dura la conexión"""
+    interval = getattr(settings, 'PROGRESS_STREAM_POLL_INTERVAL', 0.5)
+    heartbeat = getattr(settings, 'PROGRESS_STREAM_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'PROGRESS_STREAM_TIMEOUT', 300)
+    last_sent = time.monotonic()
+    
+    while time.monotonic() < deadline:
+        chunks, last_id, finished = _poll_progress(pk, last_id)
+        if chunks:
+            yield ''.join(chunks)
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= heartbeat:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        
+        if finished:
+            return
+        time.sleep(interval)
+
+async def _progress_stream_async(pk, last_id):
+    """Flujo SSE para ASGI: la espera entre consultas no bloquea ningún hilo"""
+    interval = getattr(settings, 'PROGRESS_STREAM_POLL_INTERVAL', 0.5)
+    heartbeat = getattr(settings, 'PROGRESS_STREAM_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'PROGRESS_STREAM_TIMEOUT', 300)
+    last_sent = time.monotonic()
+    poll = sync_to_async(_poll_progress)
+    
+    while time.monotonic() < deadline:
+        chunks, last_id, finished = await poll(pk, last_id)
+        if chunks:
+            yield ''.join(chunks)
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= heartbeat:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        
+        if finished:
+            return
+        await asyncio.sleep(interval)
+
+def translation_events(request, pk):
+    """
+    Endpoint Server-Sent Events con el progreso de una página
+    
+    Emite 'started', 'decoded', 'ocr' (regions), 'translated' (done/total),
+    'inpainted', 'rendered', 'retrying' si el trabajo vuelve a la cola, y por
+    último 'completed' o 'failed'. Admite
+    reconexión con la cabecera Last-Event-ID.
+    """
+    get_object_or_404(MangaPage, id=pk)
+    
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+    
+    if isinstance(request, ASGIRequest):
+        stream = _progress_stream_async(pk, last_id)
+    else:
+        stream = _progress_stream(pk, last_id)
+    
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _natural_sort_key(name):
+    """Ordena 'p2.png' antes que 'p10.png'"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def _extract_chapter_archive(archive, max_pages):
+    """
+    Extrae las imágenes de un ZIP como archivos subidos, en orden natural
+    
+    Cada imagen se descomprime por bloques a un archivo temporal, no en
+    memoria, y se limita tanto el tamaño de cada imagen (10MB, como en el
+    formulario) como el total descomprimido (CHAPTER_ARCHIVE_MAX_BYTES).
+    """
+    max_entry_bytes = 10 * 1024 * 1024
+    max_total_bytes = getattr(settings, 'CHAPTER_ARCHIVE_MAX_BYTES', 200 * 1024 * 1024)
+    
+    uploads = []
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            entries = [
+                info for info in zip_file.infolist()
+                if not info.is_dir()
+                and not os.path.basename(info.filename).startswith('.')
+                and os.path.splitext(info.filename)[1].lower() in ('.jpg', '.jpeg', '.png', '.webp')
+            ]
+        
+            if len(entries) > max_pages:
+                raise ValueError(f"El capítulo supera el máximo de {max_pages} páginas")
+        
+            # Comprobar los tamaños declarados antes de descomprimir nada
+            for info in entries:
+                if info.file_size > max_entry_bytes:
+                    raise ValueError(f"La imagen {info.filename} es demasiado grande")
+            if sum(info.file_size for info in entries) > max_total_bytes:
+                raise ValueError("El contenido descomprimido del ZIP es demasiado grande")
+            
+            total = 0
+            for info in sorted(entries, key=lambda info: _natural_sort_key(info.filename)):
+                name = os.path.basename(info.filename)
+                upload = TemporaryUploadedFile(name, mimetypes.guess_type(name)[0] or 'application/octet-stream', 0, None)
+                uploads.append(upload)
+                
+                # Los tamaños declarados pueden no ser ciertos: se cuentan los bytes reales
+                with zip_file.open(info) as entry:
+                    while True:
+                        chunk = entry.read(64 * 1024)
+                        if not chunk:
+                            break
+                        upload.size += len(chunk)
+                        total += len(chunk)
+                        if upload.size > max_entry_bytes:
+                            raise ValueError(f"La imagen {info.filename} es demasiado grande")
+                        if total > max_total_bytes:
+                            raise ValueError("El contenido descomprimido del ZIP es demasiado grande")
+                        upload.write(chunk)
+                upload.seek(0)
+    except Exception:
+        for upload in uploads:
+            upload.close()
+        raise
+    
+    return uploads
+
+@csrf_exempt
+@require_POST
+def translate_chapter(request):
+    """
+    Endpoint de API para traducir un capítulo completo
+    
+    Acepta varias imágenes en el campo 'images' (en el orden de lectura) o un
+    ZIP en el campo 'archive'. Todas las páginas se procesan en un único
+    trabajo con el pipeline por etapas.
+    """
+    archive_uploads = []
+    try:
+        max_pages = getattr(settings, 'CHAPTER_MAX_PAGES', 300)
+        
+        if 'archive' in request.FILES:
+            try:
+                uploads = _extract_chapter_archive(request.FILES['archive'], max_pages)
+            except (zipfile.BadZipFile, ValueError) as e:
+                return JsonResponse({'error': f"Archivo ZIP no válido: {str(e)}"}, status=400)
+            archive_uploads = uploads
+        else:
+            uploads = request.FILES.getlist('images')
+        
+        if not uploads:
+            return JsonResponse({'error': 'No se proporcionó ninguna imagen'}, status=400)
+        
+        if len(uploads) > max_pages:
+            return JsonResponse({'error': f"El capítulo supera el máximo de {max_pages} páginas"}, status=400)
+        
+        title = request.POST.get('title', '')
+        
+        # Validar todas las páginas antes de crear nada
+        forms = []
+        errors = {}
+        for number, upload in enumerate(uploads, start=1):
+            data = request.POST.copy()
+            data['title'] = f"{title} - {number}" if title else ''
+            form = MangaTranslationForm(data, {'original_image': upload})
+            if form.is_valid():
+                forms.append(form)
+            else:
+                errors[upload.name] = form.errors
+        
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        
+        with transaction.atomic():
+            chapter = Chapter.objects.create(
+                title=title,
+                source_language=forms[0].cleaned_data['source_language'],
+                target_language=forms[0].cleaned_data['target_language'],
+            )
+            
+            manga_pages = []
+            for number, form in enumerate(forms, start=1):
+                manga_page = form.save(commit=False)
+                manga_page.chapter = chapter
+                manga_page.page_number = number
+                manga_page.status = 'pending'
+                manga_page.save()
+                manga_pages.append(manga_page)
+        
+        enqueue_chapter(chapter)
+        
+        return JsonResponse({
+            'id': chapter.id,
+            'status': chapter.status,
+            'pages': [{'id': page.id, 'page_number': page.page_number} for page in manga_pages],
+            'status_url': reverse('api_chapter_status', kwargs={'pk': chapter.id}),
+        }, status=202)
+    
+    except Exception as e:
+        logger.error(f"Error en el endpoint de traducción de capítulos: {str(e)}")
+        return JsonResponse({'error': f"Error interno del servidor: {str(e)}"}, status=500)
+    finally:
+        # Borrar los archivos temporales extraídos del ZIP (las páginas ya se copiaron al almacenamiento)
+        for upload in archive_uploads:
+            upload.close()
+
+async def get_chapter_status(request, pk):
+    """Endpoint para verificar el estado de un capítulo y de cada una de sus páginas"""
+    try:
+        chapter = await Chapter.objects.aget(id=pk)
+    except Chapter.DoesNotExist:
+        return JsonResponse({'error': 'Capítulo no encontrado'}, status=404)
+    
+    try:
+        pages = []
+        async for manga_page in chapter.pages.order_by('page_number', 'id'):
+            pages.append({
+                'id': manga_page.id,
+                'page_number': manga_page.page_number,
+                'status': manga_page.status,
+                'translated_image': manga_page.translated_image.url if manga_page.translated_image else None,
+            })
+        
+        return JsonResponse({
+            'id': chapter.id,
+            'title': chapter.title,
+            'status': chapter.status,
+            'completed_pages': sum(1 for page in pages if page['status'] == 'completed'),
+            'total_pages': len(pages),
+            'pages': pages,
+            'created_at': chapter.created_at.isoformat(),
+            'updated_at': chapter.updated_at.isoformat(),
+        })
+    
+    except Exception as e:
+        logger.error(f"Error al obtener estado del capítulo: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+    
+
 @csrf_exempt
 @require_POST
 def update_translation_regions(request, pk):
@@ -300,26 +464,16 @@ def regenerate_translation_image(request, pk):
         manga_page.translated_text = regions
         manga_page.save()
         
-        # Procesar la imagen
+        # Procesar la imagen y guardarla en el modelo
         image_processor = ImageProcessor()
-        output_path = image_processor.process_manga_image(
-            manga_page.original_image.path,
+        save_translated_image(
+            manga_page,
+            image_processor,
+            PageContext(manga_page.original_image.path),
             regions,
-            manga_page.target_language
+            reuse_plate=True
         )
         
-        # Guardar la imagen traducida en el modelo
-        with open(output_path, 'rb') as f:
-            manga_page.translated_image.save(
-                os.path.basename(output_path),
-                ContentFile(f.read()),
-                save=True
-            )
-        
-        # Eliminar el archivo temporal si existe
-        if os.path.exists(output_path):
-            os.remove(output_path)
-        
         return JsonResponse({'success': True})
     except Exception as e:
         logger.error(f"Error al regenerar imagen: {str(e)}")
@@ -341,46 +495,60 @@ def retranslate_all_texts(request, pk):
         if not regions:
             return JsonResponse({'success': False, 'error': 'No hay textos para traducir'})
         
-        # Volver a traducir cada texto
-        for region in regions:
-            if region.get('text'):
-                # Traducir el texto original
-                translation_result = deepseek_service.translate_text(
-                    region['text'],
-                    manga_page.source_language,
-                    manga_page.target_language
-                )
-                region['translated_text'] = translation_result.get('translated_text', region['text'])
+        # Volver a traducir cada texto (en paralelo, conservando el orden)
+        regions_with_text = [region for region in regions if region.get('text')]
+        translations = deepseek_service.translate_texts(
+            [region['text'] for region in regions_with_text],
+            manga_page.source_language,
+            manga_page.target_language
+        )
+        for region, translation in zip(regions_with_text, translations):
+            region['translated_text'] = translation
         
         # Guardar las regiones actualizadas
         manga_page.translated_text = regions
         manga_page.save()
         
-        # Regenerar la imagen
+        # Regenerar la imagen y guardarla en el modelo
         image_processor = ImageProcessor()
-        output_path = image_processor.process_manga_image(
-            manga_page.original_image.path,
+        save_translated_image(
+            manga_page,
+            image_processor,
+            PageContext(manga_page.original_image.path),
             regions,
-            manga_page.target_language
+            reuse_plate=True
         )
         
-        # Guardar la imagen traducida en el modelo
-        with open(output_path, 'rb') as f:
-            manga_page.translated_image.save(
-                os.path.basename(output_path),
-                ContentFile(f.read()),
-                save=True
-            )
-        
         return JsonResponse({'success': True})
     except Exception as e:
         logger.error(f"Error al retraducir textos: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)})
     
-@csrf_exempt
-@require_POST
-def translate_text(request):
-    """Endpoint para traducir un texto individual"""
+@staff_member_required
+def service_metrics(request):
+    """Métricas del proceso: conexiones y proveedores del LLM, etapas de OCR y memoria de traducción"""
+    return JsonResponse({
+        'llm_connections': llm_clients.get_metrics(),
+        'llm_providers': get_router().get_stats(),
+        'ocr': get_ocr_stats(),
+        'translation_memory': translation_memory.get_stats(),
+    })
+
+_text_service = None
+
+def _get_text_service():
+    """Servicio compartido por las peticiones de texto, para no crear clientes en cada una"""
+    global _text_service
+    if _text_service is None:
+        _text_service = DeepseekAPIService()
+    return _text_service
+
+async def translate_text(request):
+    """Endpoint para traducir un texto individual (asíncrono bajo ASGI: la espera al LLM no ocupa un hilo)"""
+    # csrf_exempt y require_POST no admiten vistas asíncronas en Django 4.2
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
     try:
         data = json.loads(request.body)
         text = data.get('text', '')
@@ -390,11 +558,18 @@ def translate_text(request):
         if not text:
             return JsonResponse({'error': 'No se proporcionó texto para traducir'})
         
-        # Traducir texto
-        deepseek_service = DeepseekAPIService()
-        result = deepseek_service.translate_text(text, source_lang, target_lang)
+        # Traducir texto; fuera de ASGI cada petición corre en un bucle nuevo
+        # (async_to_sync), así que se usa el cliente síncrono compartido para
+        # no abrir un cliente asíncrono por petición que nunca se cierra
+        service = _get_text_service()
+        if isinstance(request, ASGIRequest):
+            result = await service.atranslate_text(text, source_lang, target_lang)
+        else:
+            result = await sync_to_async(service.translate_text)(text, source_lang, target_lang)
         
         return JsonResponse(result)
     except Exception as e:
         logger.error(f"Error al traducir texto: {str(e)}")
-        return JsonResponse({'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'error': str(e)})
+
+translate_text.csrf_exempt = True